@@ -16,3 +16,4 @@ NOT_AUTHENTICATED = "Not authenticated"
 EMAIL_CONFIRMATION_SENT = "Email confirmation sent successfully"
 EMAIL_CONFIRMED = "Email confirmed"
 USER_EMAIL_NOT_EXIST = "User with this email does not exist"
+EMAIL_CONFIRMATION_ALREADY_REQUESTED = "Email confirmation was already requested, check your inbox"
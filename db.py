@@ -2,18 +2,72 @@
 Database Connection Management
 """
 
+import asyncio
 import contextlib
+from uuid import uuid4
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from conf.config import config
 
 
+def get_connect_args(url: str) -> dict:
+    """
+    asyncpg statement cache settings.
+    Behind transaction-pooled pgbouncer the server connection rotates between clients,
+    so prepared statements can't be cached and their names have to be unique.
+
+    :param url: Database url
+    :type url: str
+    :return: connect_args for the engine
+    :rtype: dict
+    """
+    if not url.startswith("postgresql+asyncpg"):
+        return {}
+    if config.PGBOUNCER:
+        return {"statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__"}
+    return {"statement_cache_size": config.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": config.DB_STATEMENT_CACHE_SIZE}
+
+
 class DataBaseSessionManager:
     def __init__(self, url: str):
-        self._engine: AsyncEngine | None = create_async_engine(url)
+        self._engine: AsyncEngine | None = create_async_engine(url,
+                                                               poolclass=AsyncAdaptedQueuePool,
+                                                               pool_size=config.DB_POOL_SIZE,
+                                                               max_overflow=config.DB_MAX_OVERFLOW,
+                                                               pool_timeout=config.DB_POOL_TIMEOUT,
+                                                               pool_recycle=config.DB_POOL_RECYCLE,
+                                                               pool_pre_ping=True,
+                                                               pool_use_lifo=True,
+                                                               connect_args=get_connect_args(url))
         self._session_maker: async_sessionmaker = async_sessionmaker(autoflush=False,
                                                                      autocommit=False,
+                                                                     expire_on_commit=False,
                                                                      bind=self._engine)
 
+    async def warmup(self, size: int):
+        """
+        Opens pool connections ahead of the first requests, so they don't pay the connect and handshake cost.
+        Connections are checked out concurrently, each one is a new connection kept by the pool afterwards.
+
+        :param size: Number of connections, not more than the pool size
+        :type size: int
+        """
+
+        async def ping():
+            async with self._engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        try:
+            await asyncio.gather(*(ping() for _ in range(min(size, config.DB_POOL_SIZE))))
+        except (SQLAlchemyError, OSError) as err:
+            print(f'Error: {err}')
+
     @contextlib.asynccontextmanager
     async def session(self):
         if self._session_maker is None:
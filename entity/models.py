@@ -5,7 +5,8 @@ import enum
 from datetime import date
 
 from sqlalchemy.orm import backref, Mapped, mapped_column, DeclarativeBase, relationship
-from sqlalchemy import String, Date, Integer, ForeignKey, DateTime, func, Enum, Boolean
+from sqlalchemy import String, Date, Integer, ForeignKey, DateTime, func, Enum, Boolean, Index, UniqueConstraint, \
+    extract, text, SmallInteger, Computed
 
 
 class Base(DeclarativeBase):
@@ -14,11 +15,21 @@ class Base(DeclarativeBase):
 
 class Contact(Base):
     __tablename__ = 'contacts'
+    __table_args__ = (
+        UniqueConstraint("user_id", "email", name="uq_contacts_user_email"),
+        UniqueConstraint("user_id", "phone", name="uq_contacts_user_phone"),
+        Index("ix_contacts_user_first_name", "user_id", "first_name"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     first_name: Mapped[str] = mapped_column(String(50), nullable=False)
     last_name: Mapped[str] = mapped_column(String(50), nullable=True)
     birthday: Mapped[Date] = mapped_column(Date, nullable=True)
+    # month * 100 + day of the birthday (March 7 -> 307), ordered within a year and the same in leap years
+    birthday_md: Mapped[int] = mapped_column(SmallInteger,
+                                             Computed(extract('month', birthday.column) * 100
+                                                      + extract('day', birthday.column), persisted=True),
+                                             nullable=True)
     email: Mapped[str] = mapped_column(String(50), nullable=True)
     phone: Mapped[str] = mapped_column(String(50), nullable=True)
     notes: Mapped[str] = mapped_column(String(150), nullable=True)
@@ -27,7 +38,19 @@ class Contact(Base):
                                              nullable=True)
 
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=True)
-    user: Mapped["User"] = relationship("User", backref="contacts", lazy="joined")
+    user: Mapped["User"] = relationship("User", backref="contacts", lazy="selectin")
+
+
+# upcoming birthdays lookup is a range scan over (user_id, birthday_md)
+Index("ix_contacts_user_birthday_md", Contact.user_id, Contact.birthday_md)
+
+# text searched by ILIKE '%q%' in contacts search, trigram index (pg_trgm extension) on the same expression.
+# constants are inlined with text(), bound parameters would not match the indexed expression.
+contact_search_text = (func.coalesce(Contact.first_name, text("''")) + text("' '")
+                       + func.coalesce(Contact.last_name, text("''")) + text("' '")
+                       + func.coalesce(Contact.email, text("''")))
+Index("ix_contacts_search_trgm", contact_search_text.label("search_text"),
+      postgresql_using="gin", postgresql_ops={"search_text": "gin_trgm_ops"})
 
 
 class Role(enum.Enum):
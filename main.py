@@ -4,25 +4,30 @@ API Application
 
 from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
 from fastapi_limiter import FastAPILimiter
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import ASGIApp, Receive, Scope, Send
 from routes import contacts, auth, users
+import asyncio
 import re
-from ipaddress import ip_address
-from typing import Callable
+import functools
+import hashlib
+import time
+from ipaddress import ip_address, ip_network
 from pathlib import Path
 import uvicorn
 
-import redis.asyncio as redis
-
-from db import get_db
+from db import get_db, sessionmanager
+from services.cache import cache, pool as redis_pool
+from services.email import sender as email_sender, email_worker, stop_email_worker
 from conf.config import config
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # with ip_address
 # banned_ips = [
@@ -32,17 +37,48 @@ app = FastAPI()
 #     ip_address("127.0.0.1")
 # ]
 
-# ip_address as string
+# ip_address as string, single address or network in CIDR notation ("10.0.0.0/8")
 banned_ips = [
     "192.168.0.210",
     # "192.168.0.68",
     "10.10.10.10",
 ]
+BANNED_IPS: frozenset[str] = frozenset(ip for ip in banned_ips if "/" not in ip)
+BANNED_NETWORKS: tuple = tuple(ip_network(ip) for ip in banned_ips if "/" in ip)
+
+
+@functools.lru_cache(maxsize=4096)
+def _ip_is_banned(ip: str) -> bool:
+    if ip in BANNED_IPS:
+        return True
+    if not BANNED_NETWORKS:
+        return False
+    try:
+        address = ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in BANNED_NETWORKS)
+
 
 user_agent_ban_list = [r"Somebot", r"Python-urllib"]
+_UA_BAN_RE = re.compile("|".join(f"(?:{p})" for p in user_agent_ban_list), re.IGNORECASE)
+# only the head of the header is scanned: bounds regex work and lru_cache key size for oversized headers
+_UA_MAX_LEN = 512
+
+
+@functools.lru_cache(maxsize=4096)
+def _ua_is_banned(ua: str) -> bool:
+    return bool(_UA_BAN_RE.search(ua))
+
+
+IP_BANNED_BODY = b'{"detail":"IP address is banned"}'
+USER_AGENT_BANNED_BODY = b'{"detail":"User-agent is banned"}'
 
 origins = ['*']
 
+# added first, so it is the innermost middleware: banned requests are rejected before compression is set up
+app.add_middleware(GZipMiddleware, minimum_size=500)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -52,37 +88,86 @@ app.add_middleware(
 )
 
 
-@app.middleware("http")
-async def ban_ips(request: Request, call_next: Callable):
-    # with ip_address
-    # ip = ip_address(request.client.host)
-    # print(f'1: {ip=}')
-    # ip_address ass string
-    ip = request.client.host
-    # print(f'2 {ip=}')
-    if ip in banned_ips:
-        return JSONResponse(status_code=status.HTTP_403_FORBIDDEN,
-                            content={"detail": "IP address is banned"})
-    response = await call_next(request)
-    return response
-
-
-@app.middleware("http")
-async def user_agent_ban(request: Request, call_next: Callable):
-    user_agent = request.headers.get("user-agent")
-    # print(f"User-agent: {user_agent}")
-    for agent_banned in user_agent_ban_list:
-        if re.search(agent_banned, user_agent):
-            return JSONResponse(status_code=status.HTTP_403_FORBIDDEN,
-                                content={"detail": "User-agent is banned"}, )
-    response = await call_next(request)
-    return response
+class BanIPMiddleware:
+    """Rejects requests coming from banned IP addresses with 403 status code."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # with ip_address
+        # ip = ip_address(scope["client"][0])
+        client = scope.get("client")
+        if client and _ip_is_banned(client[0]):
+            await send_forbidden(send, IP_BANNED_BODY)
+            return
+        await self.app(scope, receive, send)
+
+
+class UserAgentBanMiddleware:
+    """Rejects requests with banned User-Agent header with 403 status code."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        user_agent = ""
+        for name, value in scope["headers"]:
+            if name == b"user-agent":
+                user_agent = value.decode("latin-1")
+                break
+        if user_agent and _ua_is_banned(user_agent[:_UA_MAX_LEN]):
+            await send_forbidden(send, USER_AGENT_BANNED_BODY)
+            return
+        await self.app(scope, receive, send)
+
+
+async def send_forbidden(send: Send, body: bytes):
+    """Sends 403 JSON response directly through ASGI send channel
+
+    :param send: ASGI send callable
+    :type send: Send
+    :param body: pre-encoded JSON body
+    :type body: bytes
+    """
+    await send({"type": "http.response.start",
+                "status": status.HTTP_403_FORBIDDEN,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode("latin-1"))]})
+    await send({"type": "http.response.body", "body": body})
+
+
+app.add_middleware(BanIPMiddleware)
+app.add_middleware(UserAgentBanMiddleware)
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with Cache-Control header.
+    Files with a content hash in the name (app.3f2a9c1e.css) never change and are cached for a year,
+    other files are cached for STATIC_MAX_AGE seconds.
+    """
+    STATIC_MAX_AGE = 3600
+    _hashed_name = re.compile(r"\.[0-9a-f]{8,}\.")
+
+    def file_response(self, full_path, stat_result, scope, status_code=200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if self._hashed_name.search(scope["path"]):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = f"public, max-age={self.STATIC_MAX_AGE}"
+        return response
 
 
 BASE_DIR = Path(__file__).parent
 # directory = BASE_DIR.joinpath("src").joinpath("static")
 directory = BASE_DIR.joinpath("static")
-app.mount("/static", StaticFiles(directory=directory), name="static")
+app.mount("/static", CachedStaticFiles(directory=directory), name="static")
 
 app.include_router(contacts.router, prefix='/api')
 app.include_router(auth.router, prefix='/api')
@@ -91,34 +176,53 @@ app.include_router(users.router, prefix='/api')
 
 @app.on_event("startup")
 async def startup():
-    if not config.REDIS_PASSWORD:
-        config.REDIS_PASSWORD = None
-    r = await redis.Redis(host=config.REDIS_DOMAIN,
-                          port=config.REDIS_PORT,
-                          db=0,
-                          password=config.REDIS_PASSWORD, )
-    await FastAPILimiter.init(r)
+    app.state.redis = cache
+    app.state.base_url = config.BASE_URL
+    await sessionmanager.warmup(config.DB_POOL_WARMUP)
+    await FastAPILimiter.init(cache)
+    app.state.email_worker = asyncio.create_task(email_worker())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # queued emails still need Redis (email tokens) and the SMTP pool
+    await stop_email_worker(app.state.email_worker)
+    await email_sender.quit()
+    await redis_pool.disconnect()
 
 
 templates = Jinja2Templates(directory=BASE_DIR / "templates")
 
+# the page has no per-request content: rendered once, ETag lets browsers revalidate without downloading it again
+INDEX_HTML = templates.get_template("index.html").render(about_app="Contacts App main page").encode("utf-8")
+INDEX_ETAG = f'"{hashlib.md5(INDEX_HTML, usedforsecurity=False).hexdigest()}"'
+
 
 @app.get("/", response_class=HTMLResponse)
 def index(request: Request):
-    """Returns a welcome htm page for the API
+    """Returns a welcome htm page for the API.
+    Responds with 304 status code when the page cached by the client is still valid.
 
     :param: request
     :type request: Request
     :return: html page
-    :rtype: templates.TemplateResponse
+    :rtype: HTMLResponse
     """
     # return {"message": "Contacts Application"}
-    return templates.TemplateResponse("index.html", {"request": request, "about_app": "Contacts App main page"})
+    headers = {"ETag": INDEX_ETAG, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == INDEX_ETAG:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return HTMLResponse(INDEX_HTML, headers=headers)
+
+
+_health_state = {"ts": 0.0, "ok": False}
+HEALTH_CACHE_SEC = 2.0
 
 
 @app.get("/api/healthchecker")
 async def healthchecker(db: AsyncSession = Depends(get_db)):
-    """Checks the health of the database
+    """Checks the health of the database.
+    Successful check is cached for HEALTH_CACHE_SEC seconds, so frequent liveness probes don't hit the database.
 
     :param: db
     :type db: AsyncSession
@@ -127,16 +231,20 @@ async def healthchecker(db: AsyncSession = Depends(get_db)):
     :raises: HTMLException with status code 500
 
     """
+    if _health_state["ok"] and time.monotonic() - _health_state["ts"] < HEALTH_CACHE_SEC:
+        return {"message": "Welcome to FastAPI!"}
+
     if db is None:
         raise HTTPException(status_code=500, detail="Database is not configured correctly")
 
     try:
         # Make request
-        result = await db.execute(text("SELECT 1"))
-        result = result.fetchone()
+        result = await db.scalar(text("SELECT 1"))
         if result is None:
             raise HTTPException(status_code=500, detail="Database is not configured correctly")
+        _health_state.update(ts=time.monotonic(), ok=True)
         return {"message": "Welcome to FastAPI!"}
     except Exception as e:
         print(e)
+        _health_state["ok"] = False
         raise HTTPException(status_code=500, detail="Error connecting to the database")
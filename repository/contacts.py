@@ -6,13 +6,25 @@ from datetime import timedelta, datetime
 from typing import Sequence
 
 from fastapi import HTTPException, status
-from sqlalchemy import select, or_, and_, extract
+from sqlalchemy import select, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only, noload
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from entity.models import Contact, User
+from entity.models import Contact, User, contact_search_text
 from schemas.contacts import ContactSchema, ContactResponseSchema
 from conf import messages
 
+# dialects supporting INSERT ... ON CONFLICT DO NOTHING RETURNING
+_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+# list endpoints load only the columns of ContactResponseSchema, other attributes raise instead of lazy loading
+_LIST_OPTIONS = (noload(Contact.user),
+                 load_only(Contact.id, Contact.first_name, Contact.last_name, Contact.birthday, Contact.notes,
+                           Contact.email, Contact.phone, raiseload=True))
+
 
 async def get_contacts(limit: int, offset: int, db: AsyncSession, user: User) -> [Contact]:
     """
@@ -29,7 +41,7 @@ async def get_contacts(limit: int, offset: int, db: AsyncSession, user: User) ->
     :return: A list of contacts
     :rtype: [Contact]
     """
-    stmt = select(Contact).filter_by(user=user).offset(offset).limit(limit)
+    stmt = select(Contact).options(*_LIST_OPTIONS).filter_by(user_id=user.id).offset(offset).limit(limit)
     contacts = await db.execute(stmt)
     return contacts.scalars().all()
 
@@ -48,14 +60,17 @@ async def get_contact(contact_id: int, db: AsyncSession, user: User):
     :rtype: Contact | NoneType
     """
 
-    stmt = select(Contact).filter_by(id=contact_id, user=user)
-    contact = await db.execute(stmt)
-    return contact.scalar_one_or_none()
+    # primary key lookup goes through the session identity map first
+    contact = await db.get(Contact, contact_id, options=[noload(Contact.user)])
+    if contact is None or contact.user_id != user.id:
+        return None
+    return contact
 
 
 async def create_contact(contact: ContactSchema, db: AsyncSession, user: User):
     """
-    Creates a new contact
+    Creates a new contact.
+    Duplicate email or phone of the user is skipped by ON CONFLICT DO NOTHING, so no exception and rollback is needed.
 
     :param contact: Contact object
     :type contact: ContactSchema
@@ -63,13 +78,13 @@ async def create_contact(contact: ContactSchema, db: AsyncSession, user: User):
     :type db: AsyncSession
     :param user: User object
     :type user: User
-    :return: A contact
-    :rtype: Contact
+    :return: A contact or None if contact with the same email or phone exists
+    :rtype: Contact | NoneType
     """
-    contact_obj = Contact(**contact.dict(), user=user)
-    db.add(contact_obj)
+    stmt = _INSERTS[db.bind.dialect.name](Contact).values(**contact.model_dump(), user_id=user.id)
+    stmt = stmt.on_conflict_do_nothing().returning(Contact)
+    contact_obj = await db.scalar(stmt)
     await db.commit()
-    await db.refresh(contact_obj)
     return contact_obj
 
 
@@ -88,36 +103,23 @@ async def update_contact(contact_id: int, body: ContactSchema, db: AsyncSession,
     :return: A contact or None
     :rtype: Contact | NoteType
     :raise: HTTPException with status code 404 if contact not exist
-    :raise: HTTPException with status code 409 if contact not updated
+    :raise: HTTPException with status code 409 if contact with the same email or phone exists
     """
-    stmt = select(Contact).filter_by(id=contact_id, user=user)
-    result = await db.execute(stmt)
-    contact = result.scalar_one_or_none()
+    contact = await get_contact(contact_id, db, user)
 
     if not contact:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.CONTACT_NOT_FOUND)
 
-    if body.first_name is not None:
-        contact.first_name = body.first_name
-    if body.last_name is not None:
-        contact.last_name = body.last_name
-    if body.birthday is not None:
-        contact.birthday = body.birthday
-    if body.phone is not None:
-        contact.phone = body.phone
-    if body.email is not None:
-        contact.email = body.email
-    if body.notes is not None:
-        contact.notes = body.notes
-
-    # for attr, value in body.dict().items():
-    #     if hasattr(contact, attr):  # Avoid overriding internal fields
-    #         setattr(contact, attr, value)
+    # only fields sent by the client are written, so the UPDATE contains just the changed columns
+    for field, value in body.model_dump(exclude_unset=True, exclude={"id"}).items():
+        setattr(contact, field, value)
+
     try:
-        await db.commit()
-        await db.refresh(contact)
-    except:
+        await db.flush()
+    except IntegrityError:
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=messages.CONTACT_IN_USE)
+    await db.commit()
 
     return contact
 
@@ -136,9 +138,7 @@ async def delete_contact(contact_id: int, db: AsyncSession, user: User):
     :rtype: Contact | NoneType
     """
 
-    stmt = select(Contact).filter_by(id=contact_id, user=user)
-    result = await db.execute(stmt)
-    contact_obj = result.scalar_one_or_none()
+    contact_obj = await get_contact(contact_id, db, user)
     if not contact_obj:
         return None
     await db.delete(contact_obj)
@@ -160,7 +160,7 @@ async def get_contact_by_email(email: str, db: AsyncSession, user: User) -> Cont
     :rtype: ContactResponseSchema | NoneType
     """
 
-    stmt = select(Contact).filter_by(email=email, user=user)
+    stmt = select(Contact).filter_by(email=email, user_id=user.id)
     result = await db.execute(stmt)
     contact = result.scalar_one_or_none()
     return contact
@@ -179,7 +179,7 @@ async def get_contact_by_phone(phone: str, db: AsyncSession, user: User) -> Cont
     :return: A contact or None
     :rtype: ContactResponseSchema | NoneType
     """
-    stmt = select(Contact).filter_by(phone=phone, user=user)
+    stmt = select(Contact).filter_by(phone=phone, user_id=user.id)
     result = await db.execute(stmt)
     contact = result.scalar_one_or_none()
     return contact
@@ -198,17 +198,13 @@ async def search_contacts(limit: int, offset: int, q: str, db: AsyncSession, use
     :param db: Database connection
     :type db: AsyncSession
     :param user: User object
-    :type userr: User
+    :type user: User
     :return: A list of contacts
     :rtype: Sequence[Contact]
     """
-    stmt = select(Contact).filter(
-        or_(
-            Contact.first_name.ilike(f"%{q}%"),
-            Contact.last_name.ilike(f"%{q}%"),
-            Contact.email.ilike(f"%{q}%")
-        )
-    ).filter_by(user=user).offset(offset).limit(limit).order_by(Contact.first_name)
+    stmt = select(Contact).options(*_LIST_OPTIONS).filter(
+        contact_search_text.ilike(f"%{q}%")
+    ).filter_by(user_id=user.id).offset(offset).limit(limit).order_by(Contact.first_name)
 
     result = await db.execute(stmt)
     contacts = result.scalars().all()
@@ -229,15 +225,16 @@ async def get_birthdays(db: AsyncSession, user: User):
     # get today's date and the next 7 days' dates as datetime objects
     today = datetime.now().date()
 
-    # list of the next 7 days
-    upcoming_dates = [today + timedelta(days=i) for i in range(1, 8)]
-
-    # conditions for the query
-    conditions = [and_(extract('month', Contact.birthday) == date.month, extract('day', Contact.birthday) == date.day)
-                  for date in upcoming_dates]
+    # next 7 days as month * 100 + day, the same encoding as the birthday_md column
+    first, last = today + timedelta(days=1), today + timedelta(days=7)
+    first_md, last_md = first.month * 100 + first.day, last.month * 100 + last.day
 
-    # query with OR condition for each upcoming date
-    stmt = select(Contact).where(or_(*conditions)).filter_by(user=user)
+    # range scan over the ix_contacts_user_birthday_md index, split in two at the end of the year
+    if first_md <= last_md:
+        upcoming = Contact.birthday_md.between(first_md, last_md)
+    else:
+        upcoming = or_(Contact.birthday_md >= first_md, Contact.birthday_md <= last_md)
+    stmt = select(Contact).options(*_LIST_OPTIONS).where(upcoming).filter_by(user_id=user.id)
 
     result = await db.execute(stmt)
     contacts = result.scalars().all()
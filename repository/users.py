@@ -3,14 +3,95 @@ User Management
 Provides functions for managing user accounts, including updating refresh tokens and creating new users.
 """
 
+import asyncio
+import hashlib
+
+import orjson
 from fastapi import Depends
-from libgravatar import Gravatar
-from sqlalchemy import select
+from redis.exceptions import RedisError
+from sqlalchemy import bindparam, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
 from db import get_db
-from entity.models import User
+from entity.models import User, Role
 from schemas.users import UserSchema
+from services.cache import cache
+from conf.config import config
+
+# database lookups in progress, email -> future of the serialized user, shared by concurrent cache misses
+_inflight: dict[str, asyncio.Future] = {}
+_FAILED = object()
+
+# built once, every lookup reuses the statement and its compiled form from the SQLAlchemy cache
+_user_by_email_stmt = select(User).where(User.email == bindparam("email"))
+
+
+def user_cache_key(email: str) -> str:
+    """
+    Redis key of the cached user.
+
+    :param email: User email.
+    :type email: str
+    :return: Cache key.
+    :rtype: str
+    """
+    return f"cached_user:{email}"
+
+
+def email_token_key(email: str) -> str:
+    """
+    Redis key of the email confirmation token, reused by repeated confirmation emails.
+
+    :param email: User email.
+    :type email: str
+    :return: Cache key.
+    :rtype: str
+    """
+    return f"email_token:{email}"
+
+
+def _dump_user(user: User) -> bytes:
+    # password hash and refresh token never leave the database
+    return orjson.dumps({"id": user.id, "username": user.username, "email": user.email, "avatar": user.avatar,
+                         "role": user.role.value if user.role else None, "confirmed": user.confirmed})
+
+
+def _load_user(raw: bytes) -> User:
+    data = orjson.loads(raw)
+    data["role"] = Role(data["role"]) if data["role"] else None
+    user = User(**data)
+    # detached with the identity of the row, so it can be merged into the session without a SELECT
+    make_transient_to_detached(user)
+    return user
+
+
+def gravatar_url(email: str) -> str:
+    """
+    Gravatar image url of the email, built locally without calling Gravatar.
+
+    :param email: User email.
+    :type email: str
+    :return: Avatar url.
+    :rtype: str
+    """
+    email_hash = hashlib.md5(email.strip().lower().encode("utf-8"), usedforsecurity=False).hexdigest()
+    return f"https://www.gravatar.com/avatar/{email_hash}"
+
+
+async def forget_user(email: str) -> None:
+    """
+    Drop cached user, called after every change of the user row.
+
+    :param email: User email.
+    :type email: str
+    :return: None.
+    :rtype: NoneType
+    """
+    try:
+        await cache.delete(user_cache_key(email))
+    except RedisError as err:
+        print(f'Error: {err}')
 
 
 async def update_token(user: User, token: str | None, db: AsyncSession):
@@ -28,8 +109,11 @@ async def update_token(user: User, token: str | None, db: AsyncSession):
     :raise: None.
     """
 
-    user.refresh_token = token
+    email = user.email
+    stmt = update(User).where(User.id == user.id).values(refresh_token=token)
+    await db.execute(stmt)
     await db.commit()
+    await forget_user(email)
 
 
 async def create_user(body: UserSchema, db: AsyncSession = Depends(get_db)):
@@ -45,23 +129,21 @@ async def create_user(body: UserSchema, db: AsyncSession = Depends(get_db)):
     :raise: None.
     """
 
-    avatar = None
-    try:
-        g = Gravatar(body.email)
-        avatar = g.get_image()
-    except Exception as err:
-        print(f'Error: {err}')
-
-    new_user = User(**body.model_dump(), avatar=avatar)
+    new_user = User(**body.model_dump(), avatar=gravatar_url(body.email))
     db.add(new_user)
     await db.commit()
     await db.refresh(new_user)
+    await forget_user(new_user.email)
     return new_user
 
 
 async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
     """
     Get user by email.
+    Looks up Redis first, cached user is merged into the session without a SELECT.
+    Cached user has no password hash and refresh token loaded, use get_user_with_credentials when they are needed.
+    Falls back to the database when Redis is not available.
+    Concurrent cache misses for the same email wait for a single SELECT and merge its result into their sessions.
 
     :param email: User email.
     :type email: str
@@ -71,8 +153,59 @@ async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
     :rtype: User | NoneType
     :raise: None.
     """
-    stmt = select(User).filter_by(email=email)
-    user = await db.execute(stmt)
+    key = user_cache_key(email)
+    try:
+        cached = await cache.get(key)
+    except RedisError as err:
+        print(f'Error: {err}')
+        return await _select_user_by_email(email, db)
+
+    if cached is not None:
+        return await db.merge(_load_user(cached), load=False)
+
+    inflight = _inflight.get(email)
+    if inflight is not None:
+        # shield: cancelled follower must not cancel the shared lookup
+        raw = await asyncio.shield(inflight)
+        if raw is _FAILED:
+            return await _select_user_by_email(email, db)
+        return None if raw is None else await db.merge(_load_user(raw), load=False)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[email] = future
+    raw = _FAILED
+    try:
+        user = await _select_user_by_email(email, db)
+        raw = None if user is None else _dump_user(user)
+    finally:
+        del _inflight[email]
+        future.set_result(raw)
+
+    if raw is not None:
+        try:
+            await cache.set(key, raw, ex=config.CACHE_TTL_SEC)
+        except RedisError as err:
+            print(f'Error: {err}')
+    return user
+
+
+async def get_user_with_credentials(email: str, db: AsyncSession = Depends(get_db)):
+    """
+    Get user by email with the password hash and refresh token, always read from the database.
+
+    :param email: User email.
+    :type email: str
+    :param db: Database session.
+    :type db: AsyncSession
+    :return: User object.
+    :rtype: User | NoneType
+    :raise: None.
+    """
+    return await _select_user_by_email(email, db)
+
+
+async def _select_user_by_email(email: str, db: AsyncSession):
+    user = await db.execute(_user_by_email_stmt, {"email": email})
     user = user.scalar_one_or_none()
     return user
 
@@ -108,9 +241,14 @@ async def confirmed_email(email: str, db: AsyncSession) -> None:
     :rtype: NoneType
     :raise: None.
     """
-    user = await get_user_by_email(email, db)
-    user.confirmed = True
+    stmt = update(User).where(User.email == email).values(confirmed=True)
+    await db.execute(stmt)
     await db.commit()
+    await forget_user(email)
+    try:
+        await cache.delete(email_token_key(email))
+    except RedisError as err:
+        print(f'Error: {err}')
 
 
 async def update_avatar_url(email: str, url: str | None, db: AsyncSession) -> User:
@@ -127,8 +265,9 @@ async def update_avatar_url(email: str, url: str | None, db: AsyncSession) -> Us
     :rtype: User
     :raise: None.
     """
-    user = await get_user_by_email(email, db)
-    user.avatar = url
+    stmt = update(User).where(User.email == email).values(avatar=url).returning(User)
+    result = await db.execute(stmt)
+    user = result.scalar_one()
     await db.commit()
-    await db.refresh(user)
+    await forget_user(email)
     return user
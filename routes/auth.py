@@ -2,21 +2,40 @@
 This module contains the authentication routes for the API.
 """
 
+import hmac
+
 from fastapi import APIRouter, HTTPException, Depends, Path, Query, Security, status, BackgroundTasks, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.responses import FileResponse
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
 from services.auth import auth_service
-from services.email import send_email
+from services.cache import cache
+from services.email import queue_email
 from schemas.users import UserSchema, UserResponse, TokenSchema, RequestEmail
 from repository import users as repository_users
 from db import get_db
+from conf.config import config
 from conf import messages
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 get_refresh_token = HTTPBearer()
 
 
+def get_base_url(request: Request) -> str:
+    """
+    Base url of the application used in emails.
+    Configured BASE_URL (set to app state at startup) or the url of the request.
+
+    :param request: Current request
+    :type request: Request
+    :return: Base url
+    :rtype: str
+    """
+    return getattr(request.app.state, "base_url", None) or str(request.base_url)
+
+
 @router.post('/signup', response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def signup(body: UserSchema, bt: BackgroundTasks, request: Request, db: AsyncSession = Depends(get_db)):
     """
@@ -40,9 +59,10 @@ async def signup(body: UserSchema, bt: BackgroundTasks, request: Request, db: As
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=messages.ACCOUNT_EXIST)
-    body.password = auth_service.get_password_hash(body.password)
+    # bcrypt is CPU bound, hashing in the threadpool keeps the event loop free
+    body.password = await run_in_threadpool(auth_service.get_password_hash, body.password)
     new_user = await repository_users.create_user(body, db)
-    bt.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
+    bt.add_task(queue_email, new_user.email, new_user.username, get_base_url(request))
     return new_user
 
 
@@ -61,16 +81,16 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession =
     :raise: HTTPException with status code 401 when the username or password is incorrect
     """
 
-    user = await repository_users.get_user_by_email(body.username, db)
+    user = await repository_users.get_user_with_credentials(body.username, db)
     # print(f'{body.username}, {body.password}')
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.INVALID_EMAIL)
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.EMAIL_NOT_CONFIRMED)
-    if not auth_service.verify_password(body.password, user.password):
+    if not await run_in_threadpool(auth_service.verify_password, body.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.INVALID_PASSWORD)
-    access_token = await auth_service.create_access_token(data={"sub": user.email})
-    new_refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
+    access_token = auth_service.create_access_token(data={"sub": user.email})
+    new_refresh_token = auth_service.create_refresh_token(data={"sub": user.email})
     await repository_users.update_token(user, new_refresh_token, db)
     # print(f"{access_token=}, {new_refresh_token=}")
     return {"access_token": access_token, "refresh_token": new_refresh_token, "token_type": "bearer"}
@@ -94,13 +114,14 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Depends(get_
 
     token = credentials.credentials
     email = await auth_service.decode_refresh_token(token)
-    user = await repository_users.get_user_by_email(email, db)
-    if user.refresh_token != token:
+    user = await repository_users.get_user_with_credentials(email, db)
+    # constant time comparison, doesn't leak how many leading characters of the token match
+    if not hmac.compare_digest((user.refresh_token or "").encode(), token.encode()):
         await repository_users.update_token(user, None, db)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.INVALID_REFRESH_TOKEN)
 
-    access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
+    access_token = auth_service.create_access_token(data={"sub": email})
+    refresh_token = auth_service.create_refresh_token(data={"sub": email})
     await repository_users.update_token(user, refresh_token, db)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
@@ -138,6 +159,7 @@ async def request_email(body: RequestEmail,
     """
     The request_email function takes in an email, gets the user with that email, and sends an email to the user.
     If the user does not exist, it returns a message.
+    Repeated requests for the same email within EMAIL_REQUEST_TTL_SEC seconds are answered without a database lookup.
 
     :param body: Get the email from the request body
     :type body: RequestEmail
@@ -151,13 +173,22 @@ async def request_email(body: RequestEmail,
     :rtype: dict
     """
 
+    # repeated requests for the same email within EMAIL_REQUEST_TTL_SEC don't reach the database
+    try:
+        first_request = await cache.set(f"em_req:{body.email}", 1, ex=config.EMAIL_REQUEST_TTL_SEC, nx=True)
+    except RedisError as err:
+        print(f'Error: {err}')
+        first_request = True
+    if not first_request:
+        return {"message": messages.EMAIL_CONFIRMATION_ALREADY_REQUESTED}
+
     user = await repository_users.get_user_by_email(body.email, db)
 
     if user:
         # print(f"{user.email}")
         if user.confirmed:
             return {"message": messages.EMAIL_CONFIRMED}
-        background_tasks.add_task(send_email, user.email, user.username, str(request.base_url))
+        background_tasks.add_task(queue_email, user.email, user.username, get_base_url(request))
         return {"message": messages.EMAIL_CONFIRMATION_SENT}
     else:
         return {"message": messages.USER_EMAIL_NOT_EXIST}
@@ -3,15 +3,14 @@
 Provides API routes for managing contact resources, including creating, retrieving, and updating contacts for authenticated users."""
 from fastapi import APIRouter, HTTPException, Depends, status, Path, Query, Body
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi_limiter.depends import RateLimiter
 
 from db import get_db
 from repository import contacts as repository_contacts
 from entity.models import User, Role
 from services.auth import auth_service
+from services.ratelimit import rate_limit
 from services.roles import RoleAccess
 from schemas.contacts import ContactSchema, ContactResponseSchema
-from conf.config import config
 from conf import messages
 
 router = APIRouter(prefix='/contacts', tags=['contacts'])
@@ -21,7 +20,7 @@ access_to_route_all = RoleAccess([Role.admin, Role.moderator])
 
 @router.post('/', response_model=ContactResponseSchema,
              status_code=status.HTTP_201_CREATED,
-             dependencies=[Depends(RateLimiter(times=config.LIMIT_TIMES, seconds=config.LIMIT_SECONDS))], )
+             dependencies=[Depends(rate_limit)], )
 async def create_contact(contact: ContactSchema = Body(...), db: AsyncSession = Depends(get_db),
                          user: User = Depends(auth_service.get_current_user), ):
     """
@@ -37,15 +36,14 @@ async def create_contact(contact: ContactSchema = Body(...), db: AsyncSession =
     :rtype: ContactResponseSchema
     :raise: HTTPException with status code 409 when contact already exists
     """
-    try:
-        contact = await repository_contacts.create_contact(contact, db, user)
-    except:
+    contact = await repository_contacts.create_contact(contact, db, user)
+    if contact is None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=messages.CONTACT_ALREADY_EXISTS)
     return contact
 
 
-@router.get('/search', response_model=list[ContactResponseSchema],
-            dependencies=[Depends(RateLimiter(times=config.LIMIT_TIMES, seconds=config.LIMIT_SECONDS))], )
+@router.get('/search', response_model=list[ContactResponseSchema], response_model_exclude_none=True,
+            dependencies=[Depends(rate_limit)], )
 async def search_contacts(limit: int = Query(10, ge=10, le=100),
                           offset: int = Query(0, ge=0),
                           q: str = Query(min_length=3, max_length=50),
@@ -76,8 +74,8 @@ async def search_contacts(limit: int = Query(10, ge=10, le=100),
     return contacts
 
 
-@router.get('/birthdays', response_model=list[ContactResponseSchema],
-            dependencies=[Depends(RateLimiter(times=config.LIMIT_TIMES, seconds=config.LIMIT_SECONDS))], )
+@router.get('/birthdays', response_model=list[ContactResponseSchema], response_model_exclude_none=True,
+            dependencies=[Depends(rate_limit)], )
 async def get_birthdays(db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
     """
     Retrieves a list of contacts with birthdays for the current user.
@@ -98,8 +96,8 @@ async def get_birthdays(db: AsyncSession = Depends(get_db), user: User = Depends
     return contacts_with_birthdays
 
 
-@router.get('/', response_model=list[ContactResponseSchema],
-            dependencies=[Depends(RateLimiter(times=config.LIMIT_TIMES, seconds=config.LIMIT_SECONDS))], )
+@router.get('/', response_model=list[ContactResponseSchema], response_model_exclude_none=True,
+            dependencies=[Depends(rate_limit)], )
 async def get_contacts(limit: int = Query(10, ge=10, le=100),
                        offset: int = Query(0, ge=0),
                        db: AsyncSession = Depends(get_db),
@@ -128,7 +126,7 @@ async def get_contacts(limit: int = Query(10, ge=10, le=100),
 
 
 @router.get('/{contact_id}', response_model=ContactResponseSchema,
-            dependencies=[Depends(RateLimiter(times=config.LIMIT_TIMES, seconds=config.LIMIT_SECONDS))], )
+            dependencies=[Depends(rate_limit)], )
 async def get_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
                       user: User = Depends(auth_service.get_current_user)):
     """
@@ -154,7 +152,7 @@ async def get_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(g
 
 @router.put('/{contact_id}', response_model=ContactResponseSchema,
             status_code=status.HTTP_202_ACCEPTED,
-            dependencies=[Depends(RateLimiter(times=config.LIMIT_TIMES, seconds=config.LIMIT_SECONDS))], )
+            dependencies=[Depends(rate_limit)], )
 async def update_contact(contact_id: int = Path(ge=1), body: ContactSchema = Body(...),
                          db: AsyncSession = Depends(get_db),
                          user: User = Depends(auth_service.get_current_user)):
@@ -173,23 +171,17 @@ async def update_contact(contact_id: int = Path(ge=1), body: ContactSchema = Bod
     :return: A contact by ID. If no contact is found, an HTTP 404 error is raised.
     :rtype: ContactResponseSchema
     :raise: HTTPException with status code 404 when no contact is found.
+    :raise: HTTPException with status code 409 when contact with the same email or phone exists.
     """
 
     # if not (body.first_name or body.last_name or body.email or body.phone):
     #    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing required fields")
-    try:
-        updated_contact = await repository_contacts.update_contact(contact_id, body, db, user)
-    except HTTPException as e:
-        print(f'Error: {e}')
-
-    if not updated_contact:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.CONTACT_NOT_FOUND)
-
+    updated_contact = await repository_contacts.update_contact(contact_id, body, db, user)
     return updated_contact
 
 
 @router.delete('/{contact_id}', status_code=status.HTTP_204_NO_CONTENT,
-               dependencies=[Depends(RateLimiter(times=config.LIMIT_TIMES, seconds=config.LIMIT_SECONDS))], )
+               dependencies=[Depends(rate_limit)], )
 async def delete_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
                          user: User = Depends(auth_service.get_current_user)):
     """Deletes a contact by ID
@@ -2,17 +2,17 @@
 User API Routes.
 """
 
-import pickle
 import cloudinary
 import cloudinary.uploader
 from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Path, Query, status
-from fastapi_limiter.depends import RateLimiter
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db import get_db
 from entity.models import User
 from schemas.users import UserResponse
 from services.auth import auth_service
+from services.ratelimit import rate_limit
 from conf.config import config
 from repository import users as repository_users
 
@@ -27,7 +27,7 @@ cloudinary.config(
 
 @router.get("/me",
             response_model=UserResponse,
-            dependencies=[Depends(RateLimiter(times=config.LIMIT_TIMES, seconds=config.LIMIT_SECONDS))], )
+            dependencies=[Depends(rate_limit)], )
 async def get_current_user(user: User = Depends(auth_service.get_current_user)):
     """
     Get current user.
@@ -44,12 +44,12 @@ async def get_current_user(user: User = Depends(auth_service.get_current_user)):
 
 @router.patch("/avatar",
               response_model=UserResponse,
-              dependencies=[Depends(RateLimiter(times=config.LIMIT_TIMES, seconds=config.LIMIT_SECONDS))], )
-async def get_current_user(file: UploadFile = File(),
-                           user: User = Depends(auth_service.get_current_user),
-                           db: AsyncSession = Depends(get_db), ):
+              dependencies=[Depends(rate_limit)], )
+async def update_avatar(file: UploadFile = File(),
+                        user: User = Depends(auth_service.get_current_user),
+                        db: AsyncSession = Depends(get_db), ):
     """
-    Get current user.
+    Upload new avatar of the current user.
 
     :param file: Get the file from the request
     :type: UploadFile
@@ -62,10 +62,10 @@ async def get_current_user(file: UploadFile = File(),
     """
 
     # pubic_id = f"HW-13/{user.email}"
-    res = cloudinary.uploader.upload(file.file, overwrite=True)
+    # blocking HTTP upload, runs in the threadpool so other requests are not stalled
+    res = await run_in_threadpool(cloudinary.uploader.upload, file.file, overwrite=True)
     # print(f"{res=}")
     res_url = res.get("secure_url")
+    # cached user is dropped by update_avatar_url, next request loads the new avatar
     user = await repository_users.update_avatar_url(user.email, res_url, db)
-    auth_service.cache.set(user.email, pickle.dumps(user))
-    auth_service.cache.expire(user.email, config.CACHE_TTL_SEC)
     return user
@@ -2,11 +2,11 @@
 Authentication Services
 """
 
-import pickle
+import functools
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 
-import redis
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
@@ -15,19 +15,34 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from conf.config import config
 from db import get_db
+from entity.models import User, Role
 from repository import users as repository_users
 from conf import messages
 
 
+@functools.lru_cache(maxsize=4096)
+def verified_access_token(token: str) -> tuple[str, int]:
+    """
+    Verifies signature and scope of the access token, result is memoised per token,
+    so repeated requests with the same token skip the signature check. Invalid tokens are never cached.
+
+    :param token: Access token
+    :type token: str
+    :return: Email (sub) and expiration timestamp (exp) of the token
+    :rtype: tuple[str, int]
+    :raise: JWTError if the token is invalid
+    """
+    payload = jwt.decode(token, config.SECRET_KEY_JWT, algorithms=[config.ALGORITHM])
+    if payload.get('scope') != 'access_token' or payload.get('sub') is None:
+        raise JWTError(messages.INVALID_SCOPE_FOR_TOKEN)
+    return payload['sub'], payload['exp']
+
+
 class Auth:
     pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
     # openssl rand -hex 32
     SECRET_KEY = config.SECRET_KEY_JWT
     ALGORITHM = config.ALGORITHM
-    cache = redis.Redis(host=config.REDIS_DOMAIN,
-                        port=config.REDIS_PORT,
-                        db=0,
-                        password=config.REDIS_PASSWORD, )
 
     def verify_password(self, plain_password, hashed_password):
         return self.pwd_context.verify(plain_password, hashed_password)
@@ -38,9 +53,9 @@ class Auth:
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl='api/auth/login')
 
     # generate new access token
-    async def create_access_token(self, data: dict,
-                                  expire_delta:
-                                  Optional[float] = None):
+    def create_access_token(self, data: dict,
+                            expire_delta:
+                            Optional[float] = None):
         to_encode = data.copy()
         if expire_delta:
             expire = datetime.utcnow() + timedelta(seconds=expire_delta)
@@ -50,7 +65,7 @@ class Auth:
         encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_access_token
 
-    async def create_refresh_token(self, data: dict, expires_delta: Optional[float] = None):
+    def create_refresh_token(self, data: dict, expires_delta: Optional[float] = None):
         to_encode = data.copy()
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
@@ -76,31 +91,17 @@ class Auth:
                                               headers={"WWW-Authenticate": "Bearer"}, )
 
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                # print(f"{email=}")
-                if email is None:
-                    raise credentials_exception
-            else:
-                raise credentials_exception
-        except JWTError as e:
+            email, expire = verified_access_token(token)
+        except JWTError:
+            raise credentials_exception
+        # memoised token is still checked for expiration on every request
+        if expire <= time.time():
             raise credentials_exception
 
-        user_hash = str(email)
-
-        user = self.cache.get(user_hash)
-
+        # cached by the repository under user_cache_key(email), a hit is merged into the session without a SELECT
+        user = await repository_users.get_user_by_email(email, db)
         if user is None:
-            print(f"Getting from database")
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
-                raise credentials_exception
-            self.cache.set(user_hash, pickle.dumps(user))
-            self.cache.expire(user_hash, time=600)
-        else:
-            print(f"Getting from cache:")
-            user = pickle.loads(user)
+            raise credentials_exception
         return user
 
     # ???
@@ -0,0 +1,18 @@
+"""
+Cache Services
+"""
+
+import redis.asyncio as redis
+
+from conf.config import config
+
+# bounded pool, waits for a free connection instead of failing when all of them are busy
+pool = redis.BlockingConnectionPool(host=config.REDIS_DOMAIN,
+                                    port=config.REDIS_PORT,
+                                    db=0,
+                                    password=config.REDIS_PASSWORD or None,
+                                    max_connections=config.REDIS_MAX_CONNECTIONS,
+                                    decode_responses=False, )
+
+# shared async Redis client: user cache, rate limiter (see main.startup)
+cache = redis.Redis(connection_pool=pool)
@@ -2,15 +2,24 @@
 Email Services
 """
 
+import asyncio
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from fastapi_mail import MessageSchema, ConnectionConfig, MessageType
 from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
+from redis.exceptions import RedisError
 
 from conf.config import config
 from conf import messages
 from services.auth import auth_service
+from services.cache import cache
+from repository.users import email_token_key
 
 conf = ConnectionConfig(MAIL_USERNAME=config.MAIL_USERNAME,
                         MAIL_PASSWORD=config.MAIL_PASSWORD,
@@ -24,10 +33,162 @@ conf = ConnectionConfig(MAIL_USERNAME=config.MAIL_USERNAME,
                         VALIDATE_CERTS=True,
                         TEMPLATE_FOLDER=Path(__file__).parent / "templates", )
 
+# parsed once at import, templates don't change while the app runs
+templates = Environment(loader=FileSystemLoader(conf.TEMPLATE_FOLDER), auto_reload=False, cache_size=-1,
+                        autoescape=select_autoescape())
+verification_template = templates.get_template("email_verification.html")
+
+
+class EmailSender:
+    """
+    Sends emails over a pool of SMTP connections kept open between messages,
+    instead of FastMail's connection (and TLS handshake) per email.
+    Connections are opened on first use, checked with NOOP before reuse,
+    reopened when the server dropped them and cycled after MAX_MESSAGES messages.
+    """
+    POOL_SIZE = 5
+    MAX_MESSAGES = 100
+
+    def __init__(self, settings: ConnectionConfig, pool_size: int = POOL_SIZE):
+        self.settings = settings
+        self.sender = f"{settings.MAIL_FROM_NAME} <{settings.MAIL_FROM}>" if settings.MAIL_FROM_NAME \
+            else settings.MAIL_FROM
+        # Message-ID domain of the sender, make_msgid would resolve the host name for every message
+        self.msgid_domain = str(settings.MAIL_FROM).rpartition("@")[2]
+        # idle connections as (smtp, messages sent), None until the slot is used the first time
+        self._pool: asyncio.Queue[tuple[aiosmtplib.SMTP | None, int]] = asyncio.Queue()
+        for _ in range(pool_size):
+            self._pool.put_nowait((None, 0))
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(hostname=self.settings.MAIL_SERVER,
+                               port=self.settings.MAIL_PORT,
+                               timeout=self.settings.TIMEOUT,
+                               use_tls=self.settings.MAIL_SSL_TLS,
+                               start_tls=self.settings.MAIL_STARTTLS,
+                               validate_certs=self.settings.VALIDATE_CERTS)
+        await smtp.connect()
+        if self.settings.USE_CREDENTIALS:
+            await smtp.login(self.settings.MAIL_USERNAME, self.settings.MAIL_PASSWORD)
+        return smtp
+
+    @staticmethod
+    async def _close(smtp: aiosmtplib.SMTP | None):
+        if smtp is None:
+            return
+        try:
+            await smtp.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            smtp.close()
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Take a connection from the pool, waits while all POOL_SIZE connections are busy.
+        The connection is returned to the pool after use, or dropped if sending failed.
+
+        :return: Connected SMTP client
+        :rtype: aiosmtplib.SMTP
+        """
+        smtp, sent = await self._pool.get()
+        try:
+            if smtp is not None and sent < self.MAX_MESSAGES:
+                try:
+                    await smtp.noop()
+                except aiosmtplib.SMTPException:
+                    await self._close(smtp)
+                    smtp = None
+            else:
+                await self._close(smtp)
+                smtp = None
+            if smtp is None:
+                smtp, sent = await self._connect(), 0
+            yield smtp
+            sent += 1
+        except BaseException:
+            await self._close(smtp)
+            smtp, sent = None, 0
+            raise
+        finally:
+            self._pool.put_nowait((smtp, sent))
+
+    def build_message(self, message: MessageSchema) -> EmailMessage:
+        """
+        MIME message with the already rendered body, attachments and custom headers are not used by the app.
+
+        :param message: Email message
+        :type message: MessageSchema
+        :return: Message ready to be sent
+        :rtype: EmailMessage
+        """
+        msg = EmailMessage()
+        msg["Date"] = formatdate(localtime=True)
+        msg["Message-ID"] = make_msgid(domain=self.msgid_domain)
+        msg["To"] = ", ".join(message.recipients)
+        msg["From"] = self.sender
+        msg["Subject"] = message.subject
+        msg.set_content(message.body, subtype=message.subtype.value, charset=message.charset)
+        return msg
+
+    async def send_message(self, message: MessageSchema):
+        """
+        Send email with already rendered body.
+
+        :param message: Email message
+        :type message: MessageSchema
+        :raise: ConnectionErrors if the email can't be sent
+        """
+        msg = self.build_message(message)
+
+        try:
+            async with self.acquire() as smtp:
+                await smtp.send_message(msg)
+        except (aiosmtplib.SMTPException, OSError) as err:
+            raise ConnectionErrors(f"Exception raised {err}, check your credentials or email service configuration")
+
+    async def quit(self):
+        """
+        Close idle SMTP connections, called on app shutdown.
+        """
+        for _ in range(self._pool.qsize()):
+            smtp, _sent = self._pool.get_nowait()
+            await self._close(smtp)
+            self._pool.put_nowait((None, 0))
+
+
+sender = EmailSender(conf)
+
+
+async def get_email_token(email: str) -> str:
+    """
+    Email confirmation token of the user.
+    Token signed for the previous email is reused for EMAIL_TOKEN_TTL_SEC seconds, dropped when the email is confirmed.
+
+    :param email: Email address
+    :type email: str
+    :return: Token
+    :rtype: str
+    """
+    key = email_token_key(email)
+    try:
+        token = await cache.get(key)
+        if token:
+            return token.decode()
+    except RedisError as err:
+        print(f'Error: {err}')
+        return auth_service.create_email_token({"sub": email})
+    token = auth_service.create_email_token({"sub": email})
+    try:
+        await cache.set(key, token, ex=config.EMAIL_TOKEN_TTL_SEC)
+    except RedisError as err:
+        print(f'Error: {err}')
+    return token
+
 
 async def send_email(email: EmailStr, username: str, host: str):
     """
-    Send email to user
+    Send email to user.
+    Coroutine on top of aiosmtplib, so SMTP traffic never blocks a threadpool worker.
 
     :param email: Email address
     :type email: EmailStr
@@ -36,17 +197,110 @@ async def send_email(email: EmailStr, username: str, host: str):
     :param host: Host
     :type host: str
     :return: None
+    :raise: ConnectionErrors if the email can't be sent
     """
 
     # print(f"Sending email to {email}")
+    token_verification = await get_email_token(email)
+    message = MessageSchema(subject=messages.EMAIL_CONFIRMATION_SUBJECT,
+                            recipients=[email],
+                            body=verification_template.render(host=host, username=username,
+                                                              token=token_verification),
+                            subtype=MessageType.html)
+    # print(f"{message}")
+    await sender.send_message(message)
+
+
+# confirmation emails waiting for the worker as (email, username, host), None stops the worker
+outbox: asyncio.Queue[tuple[str, str, str] | None] = asyncio.Queue()
+BATCH_SIZE = 30
+FLUSH_INTERVAL_SEC = 0.5
+SHUTDOWN_TIMEOUT_SEC = 10
+
+
+async def queue_email(email: EmailStr, username: str, host: str):
+    """
+    Queue confirmation email, sent by email_worker with the next batch.
+    Routes schedule it with BackgroundTasks, the response doesn't wait for it.
+
+    :param email: Email address
+    :type email: EmailStr
+    :param username: Username
+    :type username: str
+    :param host: Host
+    :type host: str
+    :return: None
+    """
+    outbox.put_nowait((email, username, host))
+
+
+async def send_batch(batch: list[tuple[str, str, str]]):
+    """
+    Send queued emails, EmailSender.POOL_SIZE at a time over the pooled SMTP connections.
+    The rest of the batch is dropped once a third of it failed, the mail server is most likely down,
+    users can request the email again.
+
+    :param batch: Queued emails
+    :type batch: list[tuple[str, str, str]]
+    :return: None
+    """
+    failed = 0
+    for start in range(0, len(batch), EmailSender.POOL_SIZE):
+        chunk = batch[start:start + EmailSender.POOL_SIZE]
+        results = await asyncio.gather(*(send_email(*item) for item in chunk), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"Error: {result}")
+        if failed * 3 >= len(batch):
+            skipped = len(batch) - start - len(chunk)
+            print(f"Error: {failed + skipped} of {len(batch)} emails not sent, {failed} failed")
+            return
+
+
+async def email_worker():
+    """
+    Send queued emails in batches: every FLUSH_INTERVAL_SEC seconds or as soon as BATCH_SIZE emails are waiting.
+    Started at app startup, stopped by stop_email_worker at shutdown after the queued emails are sent.
+
+    :return: None
+    """
+    loop = asyncio.get_running_loop()
+    stopped = False
+    while not stopped:
+        item = await outbox.get()
+        if item is None:
+            return
+        batch = [item]
+        deadline = loop.time() + FLUSH_INTERVAL_SEC
+        while len(batch) < BATCH_SIZE:
+            try:
+                item = await asyncio.wait_for(outbox.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                stopped = True
+                break
+            batch.append(item)
+        try:
+            await send_batch(batch)
+        except Exception as err:
+            # the worker must outlive a failed batch, otherwise every later email stays in the queue
+            print(f"Error: {err}")
+
+
+async def stop_email_worker(worker: asyncio.Task, timeout: float = SHUTDOWN_TIMEOUT_SEC):
+    """
+    Let the worker send the emails queued so far and wait for it, it's cancelled after timeout seconds.
+
+    :param worker: Task running email_worker
+    :type worker: asyncio.Task
+    :param timeout: Seconds to wait for the queued emails
+    :type timeout: float
+    :return: None
+    """
+    outbox.put_nowait(None)
     try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(subject=messages.EMAIL_CONFIRMATION_SUBJECT,
-                                recipients=[email],
-                                template_body={"host": host, "username": username, "token": token_verification},
-                                subtype=MessageType.html)
-        fm = FastMail(conf)
-        # print(f"{message}")
-        await fm.send_message(message, template_name="email_verification.html")
-    except ConnectionErrors as err:
-        print(f"Error: {err}")
+        await asyncio.wait_for(worker, timeout)
+    except asyncio.TimeoutError:
+        print(f"Error: email worker stopped after {timeout} s, {outbox.qsize()} queued emails not sent")
@@ -0,0 +1,51 @@
+"""
+Rate Limit Services
+"""
+
+import hashlib
+
+from fastapi import Request, Response
+from fastapi_limiter import FastAPILimiter
+from redis.exceptions import NoScriptError, RedisError
+
+from conf.config import config
+
+# INCR and PEXPIRE in one round-trip, returns 0 while in the limit, else milliseconds until the window resets
+LUA_SCRIPT = """local current = redis.call('INCR', KEYS[1])
+if current == 1 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+if current > tonumber(ARGV[1]) then
+    return redis.call('PTTL', KEYS[1])
+end
+return 0"""
+LUA_SHA = hashlib.sha1(LUA_SCRIPT.encode("utf-8")).hexdigest()
+
+
+class RateLimit:
+    """
+    Fixed window rate limiter, one EVALSHA per request.
+    Redis client, key prefix, identifier and callback are the ones registered by FastAPILimiter.init at startup.
+    """
+
+    def __init__(self, times: int, seconds: int):
+        self.times = str(times)
+        self.milliseconds = str(seconds * 1000)
+
+    async def __call__(self, request: Request, response: Response):
+        redis = FastAPILimiter.redis
+        rate_key = await FastAPILimiter.identifier(request)
+        key = f"{FastAPILimiter.prefix}:{rate_key}:{request.method}"
+        try:
+            try:
+                pexpire = await redis.evalsha(LUA_SHA, 1, key, self.times, self.milliseconds)
+            except NoScriptError:
+                pexpire = await redis.eval(LUA_SCRIPT, 1, key, self.times, self.milliseconds)
+        except RedisError as err:
+            print(f'Error: {err}')
+            return
+        if pexpire != 0:
+            return await FastAPILimiter.http_callback(request, response, pexpire)
+
+
+rate_limit = RateLimit(times=config.LIMIT_TIMES, seconds=config.LIMIT_SECONDS)
@@ -10,7 +10,8 @@ from conf.messages import FORBIDDEN
 
 class RoleAccess:
     def __init__(self, allowed_roles: list[Role]):
-        self.allowed_roles = allowed_roles
+        # hashed membership check on every request of the protected routes
+        self.allowed_roles = frozenset(allowed_roles)
 
     async def __call__(self, request: Request, user: User = Depends(auth_service.get_current_user)):
         # print(user.role, self.allowed_roles)
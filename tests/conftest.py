@@ -1,8 +1,9 @@
 import asyncio
+import sys
 
 import pytest
 import pytest_asyncio
-from fastapi.testclient import TestClient
+from httpx import AsyncClient, ASGITransport
 from sqlalchemy.pool import StaticPool
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
@@ -10,8 +11,11 @@ from main import app
 from entity.models import Base, User
 from db import get_db
 from services.auth import auth_service
+from services.ratelimit import rate_limit
+from fakes import FakeAsyncSession, FakeRedis
 
-SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+# in-memory database, StaticPool keeps the single connection (and so the data) for all sessions
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
 engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool
@@ -27,32 +31,75 @@ test_contact1 = {
     "notes": "user 1 notes"
 
 }
+test_contact_updated = {
+    "first_name": "Jack_updated",
+    "last_name": "Smith_updated",
+    "email": "jack_updated@example.com",
+    "birthday": "2000-01-01",
+    "phone": "1234567890",
+    "notes": "user 1 notes_updated"
+}
 test_user = {
     "username": "user",
     "password": "12345678",
     "email": "user@example.com",
     "avatar": "https://gravatar/123"
 }
+# bcrypt hash of test_user["password"], hashing it on every run only slows the setup down
+TEST_USER_PWHASH = "$2b$12$bVaocfpKHdFaOOK0A3IOFug8hOEeZDkAdsd27LyKR/UtNEgv0qkka"
 
 
-@pytest.fixture(scope="module", autouse=True)
-def init_models_wrap():
-    async def init_models():
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.drop_all)
-            await conn.run_sync(Base.metadata.create_all)
-        async with TestingSessionLocal() as session:
-            hash_password = auth_service.get_password_hash(test_user["password"])
-            current_user = User(username=test_user["username"], email=test_user["email"], password=hash_password,
-                                confirmed=True, role="user")
-            session.add(current_user)
-            await session.commit()
+# module of the test that last reset the tables
+seeded_module = None
 
-    asyncio.run(init_models())
 
+@pytest.fixture(scope="session")
+def event_loop_policy():
+    # uvloop where it's available (not on Windows), the default asyncio loop otherwise
+    if sys.platform != "win32":
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            return uvloop.EventLoopPolicy()
+    return asyncio.DefaultEventLoopPolicy()
+
+
+def pytest_collection_modifyitems(items):
+    # all async tests share one event loop instead of a new loop per test
+    session_loop = pytest.mark.asyncio(scope="session")
+    for item in items:
+        if pytest_asyncio.is_async_test(item):
+            item.add_marker(session_loop, append=False)
+
+
+@pytest_asyncio.fixture(scope="session")
+async def create_models():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def init_models_wrap(request, create_models):
+    # schema is created once per session, every module starts with empty tables and the seed user
+    global seeded_module
+    if request.module is seeded_module:
+        return
+    seeded_module = request.module
+    async with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            await conn.execute(table.delete())
+    async with TestingSessionLocal() as session:
+        current_user = User(username=test_user["username"], email=test_user["email"], password=TEST_USER_PWHASH,
+                            confirmed=True, role="user")
+        session.add(current_user)
+        await session.commit()
 
-@pytest.fixture(scope="module")
-def client():
+
+@pytest_asyncio.fixture()
+async def client():
     # Dependency override
 
     async def override_get_db():
@@ -66,16 +113,57 @@ def client():
             await session.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    # no rate limit in tests
+    app.dependency_overrides[rate_limit] = lambda: None
 
-    # Create the test client with the desired base URL
-    client = TestClient(app)
-    client.base_url = "http://127.0.0.1:8000"  # Set the base URL
+    # requests go straight to the ASGI app on the test event loop, no thread portal per request
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://127.0.0.1:8000",
+                           follow_redirects=True) as client:
+        yield client
 
-    # yield TestClient(app)
-    yield client
 
+@pytest.fixture(scope="session", autouse=True)
+def redis_mock():
+    # in-memory Redis in every module holding the shared client, tests never reach a Redis server
+    redis_mock = FakeRedis()
+    with pytest.MonkeyPatch.context() as mp:
+        for target in ("services.cache", "repository.users", "routes.auth", "services.email"):
+            mp.setattr(f"{target}.cache", redis_mock)
+        yield redis_mock
 
-@pytest_asyncio.fixture()
-async def get_token():
-    token = await auth_service.create_access_token(data={"sub": test_user["email"]})
+
+@pytest.fixture(autouse=True)
+def clear_cache(redis_mock):
+    # every test starts with an empty cache, tests may write the database past the repository invalidation
+    yield
+    redis_mock.clear()
+
+
+@pytest.fixture(scope="module")
+def get_token():
+    token = auth_service.create_access_token(data={"sub": test_user["email"]})
     return token
+
+
+@pytest.fixture(scope="module")
+def auth_headers(get_token):
+    return {"Authorization": f"Bearer {get_token}"}
+
+
+# repository unit tests
+
+@pytest.fixture(scope="session")
+def user():
+    return User(id=1, username='user', password='12345678', email='user@example.com', confirmed=True)
+
+
+@pytest.fixture(scope="module")
+def _fake_session():
+    return FakeAsyncSession()
+
+
+@pytest.fixture()
+def session(_fake_session):
+    # one fake per module, reset after every test instead of allocating a new one
+    yield _fake_session
+    _fake_session.reset()
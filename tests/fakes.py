@@ -0,0 +1,144 @@
+import hashlib
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from redis.exceptions import NoScriptError
+
+
+class FakeAsyncSession:
+    """AsyncSession stand-in with only the methods the repositories call, cheaper than AsyncMock(spec=AsyncSession)."""
+    # create_contact picks the INSERT dialect from the bound engine
+    bind = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+
+    def __init__(self):
+        self.execute = AsyncMock()
+        self.scalar = AsyncMock()
+        self.get = AsyncMock()
+        self.merge = AsyncMock()
+        self.commit = AsyncMock()
+        self.flush = AsyncMock()
+        self.rollback = AsyncMock()
+        self.refresh = AsyncMock()
+        self.delete = AsyncMock()
+        self.add = MagicMock()
+
+    def reset(self):
+        """Forget calls, return values and side effects, so one instance can serve the next test."""
+        for mock in vars(self).values():
+            mock.reset_mock(return_value=True, side_effect=True)
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the shared redis.asyncio client, so tests never reach a Redis server.
+    Values are kept as bytes like the client returns them, expiration is not simulated.
+    """
+
+    def __init__(self):
+        self.data: dict[str, bytes] = {}
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode()
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = self._encode(value)
+        return True
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def clear(self):
+        self.data.clear()
+
+
+class FakeLimiterRedis:
+    """Redis stand-in for RateLimit: runs the fixed window script on in-memory counters, the window never expires."""
+
+    def __init__(self):
+        self.counters: dict[str, int] = {}
+        self.scripts: set[str] = set()
+        self.error = None
+
+    def _run(self, key, times, milliseconds):
+        if self.error:
+            raise self.error
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return int(milliseconds) if self.counters[key] > int(times) else 0
+
+    async def evalsha(self, sha, numkeys, key, times, milliseconds):
+        if sha not in self.scripts:
+            raise NoScriptError("No matching script. Please use EVAL.")
+        return self._run(key, times, milliseconds)
+
+    async def eval(self, script, numkeys, key, times, milliseconds):
+        self.scripts.add(hashlib.sha1(script.encode("utf-8")).hexdigest())
+        return self._run(key, times, milliseconds)
+
+
+class FakeSMTP:
+    """aiosmtplib.SMTP stand-in, every created client is kept in FakeSMTP.created."""
+    created: list["FakeSMTP"] = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.connected = False
+        self.sent = []
+        self.noop_error = None
+        self.send_error = None
+        FakeSMTP.created.append(self)
+
+    async def connect(self):
+        self.connected = True
+
+    async def login(self, username, password):
+        pass
+
+    async def noop(self):
+        if self.noop_error:
+            raise self.noop_error
+
+    async def send_message(self, message):
+        if self.send_error:
+            raise self.send_error
+        self.sent.append(message)
+
+    async def quit(self):
+        self.connected = False
+
+    def close(self):
+        self.connected = False
+
+
+# plain objects for execute results: the tests only read them, call tracking of MagicMock is not needed
+
+def execute_result(**values):
+    """Result of session.execute, every keyword becomes a method returning the value, e.g. scalar_one_or_none=user."""
+    return SimpleNamespace(**{name: (lambda value=value: value) for name, value in values.items()})
+
+
+def stub_execute(session, *results):
+    """Make the following session.execute calls return the prebuilt results, one per call."""
+    session.execute.side_effect = list(results)
+    return results
+
+
+def stub_scalars_all(session, rows):
+    """Make session.execute return a result whose scalars().all() are the rows."""
+    result = execute_result(scalars=execute_result(all=rows))
+    stub_execute(session, result)
+    return result
+
+
+def stub_scalar_one_or_none(session, value):
+    """Make session.execute return a result whose scalar_one_or_none() is the value."""
+    result = execute_result(scalar_one_or_none=value)
+    stub_execute(session, result)
+    return result
@@ -1,10 +1,10 @@
-from unittest.mock import Mock
+from unittest.mock import Mock, AsyncMock
 
-import pytest
+import orjson
 from sqlalchemy import select
 
 from entity.models import User
-from tests.conftest import TestingSessionLocal
+from conftest import TestingSessionLocal
 from conf import messages
 
 user_data = {
@@ -14,36 +14,35 @@ user_data = {
 }
 
 
-def test_signup(client, monkeypatch):
+async def test_signup(client, monkeypatch):
     mock_send_email = Mock()
-    monkeypatch.setattr("routes.auth.send_email", mock_send_email)
-    response = client.post("api/auth/signup", json=user_data)
+    monkeypatch.setattr("routes.auth.queue_email", mock_send_email)
+    response = await client.post("api/auth/signup", json=user_data)
     assert response.status_code == 201, response.text
-    data = response.json()
+    data = orjson.loads(response.content)
     assert data["username"] == user_data["username"]
     assert data["email"] == user_data["email"]
     assert "password" not in data
     assert "avatar" in data
 
 
-def test_signup_duplicate_username(client, monkeypatch):
+async def test_signup_duplicate_username(client, monkeypatch):
     mock_send_email = Mock()
-    monkeypatch.setattr("routes.auth.send_email", mock_send_email)
-    response = client.post("api/auth/signup", json=user_data)
+    monkeypatch.setattr("routes.auth.queue_email", mock_send_email)
+    response = await client.post("api/auth/signup", json=user_data)
     assert response.status_code == 409, response.text
-    data = response.json()
+    data = orjson.loads(response.content)
     assert data["detail"] == messages.ACCOUNT_EXIST
 
 
-def test_not_confirmed_login(client):
-    response = client.post("api/auth/login", data={"username": user_data.get("email"),
+async def test_not_confirmed_login(client):
+    response = await client.post("api/auth/login", data={"username": user_data.get("email"),
                                                    "password": user_data.get("password")})
     assert response.status_code == 401, response.text
-    data = response.json()
+    data = orjson.loads(response.content)
     assert data["detail"] == messages.EMAIL_NOT_CONFIRMED
 
 
-@pytest.mark.asyncio
 async def test_login(client):
     async with TestingSessionLocal() as session:
         current_user = await session.execute(select(User).where(User.email == user_data.get("email")))
@@ -52,42 +51,49 @@ async def test_login(client):
             current_user.confirmed = True
             await session.commit()
 
-    response = client.post("api/auth/login",
+    response = await client.post("api/auth/login",
                            data={"username": user_data.get("email"), "password": user_data.get("password")})
     assert response.status_code == 200, response.text
-    data = response.json()
+    data = orjson.loads(response.content)
     assert "access_token" in data
     assert "refresh_token" in data
     assert "token_type" in data
 
 
-def test_wrong_password_login(client):
-    response = client.post("api/auth/login",
+async def test_wrong_password_login(client):
+    response = await client.post("api/auth/login",
                            data={"username": user_data.get("email"), "password": "invalid_password"})
     assert response.status_code == 401, response.text
-    data = response.json()
+    data = orjson.loads(response.content)
     assert data["detail"] == messages.INVALID_PASSWORD
 
 
-def test_wrong_email_login(client):
-    response = client.post("api/auth/login",
+async def test_wrong_email_login(client):
+    response = await client.post("api/auth/login",
                            data={"username": "invalid_data", "password": user_data.get("password")})
     assert response.status_code == 401, response.text
-    data = response.json()
+    data = orjson.loads(response.content)
     assert data["detail"] == messages.INVALID_EMAIL
 
 
-def test_validation_error_login(client):
-    response = client.post("api/auth/login",
+async def test_validation_error_login(client):
+    response = await client.post("api/auth/login",
                            data={"password": user_data.get("password")})
     assert response.status_code == 422, response.text
-    data = response.json()
+    data = orjson.loads(response.content)
     assert "detail" in data
 
 
-def test_request_email(client):
-    response = client.post("api/auth/request_email",
+async def test_request_email(client):
+    response = await client.post("api/auth/request_email",
                            data={"username": user_data.get("email")})
     # assert response.status_code == 200, response.text :TODO check data
-    data = response.json()
+    data = orjson.loads(response.content)
     # assert data["message"] == messages.EMAIL_CONFIRMATION_SENT
+
+
+async def test_request_email_repeated(client, monkeypatch):
+    monkeypatch.setattr("routes.auth.cache.set", AsyncMock(return_value=None))
+    response = await client.post("api/auth/request_email", json={"email": user_data.get("email")})
+    assert response.status_code == 200, response.text
+    assert orjson.loads(response.content)["message"] == messages.EMAIL_CONFIRMATION_ALREADY_REQUESTED
@@ -0,0 +1,72 @@
+from datetime import date, datetime
+
+import orjson
+import pytest
+from sqlalchemy import delete
+
+from entity.models import Contact
+from conftest import TestingSessionLocal
+
+# first name -> birthday, the names are what the assertions compare
+_BIRTHDAYS = {
+    "Today": date(1985, 6, 10),
+    "Tomorrow": date(1990, 6, 11),
+    "Week": date(2000, 6, 17),
+    "Eighth": date(1979, 6, 18),
+    "NewYearEve": date(1995, 12, 31),
+    "NewYear": date(2001, 1, 1),
+    "January3": date(1988, 1, 3),
+    "January4": date(1988, 1, 4),
+    "Leap": date(2000, 2, 29),
+    "March1": date(1999, 3, 1),
+}
+
+
+@pytest.fixture()
+async def birthday_contacts():
+    async with TestingSessionLocal() as session:
+        await session.execute(delete(Contact))
+        session.add_all(Contact(first_name=name, birthday=birthday, user_id=1) for name, birthday in _BIRTHDAYS.items())
+        await session.commit()
+
+
+def freeze_today(monkeypatch, today: date):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(today.year, today.month, today.day, 12)
+
+    monkeypatch.setattr("repository.contacts.datetime", FrozenDatetime)
+
+
+@pytest.mark.parametrize("today, expected", [
+    # birthdays from tomorrow to today + 7 days
+    (date(2023, 6, 10), {"Tomorrow", "Week"}),
+    # windows across the new year: Dec 29 - Jan 4 and Dec 28 - Jan 3
+    (date(2023, 12, 28), {"NewYearEve", "NewYear", "January3", "January4"}),
+    (date(2023, 12, 27), {"NewYearEve", "NewYear", "January3"}),
+    # Feb 29 birthday is in the window in leap and in common years,
+    # a common year window ending on Feb 28 doesn't list it, the next one (up to Mar 1) does
+    (date(2024, 2, 25), {"Leap", "March1"}),
+    (date(2023, 2, 25), {"Leap", "March1"}),
+    (date(2024, 2, 28), {"Leap", "March1"}),
+    (date(2024, 2, 22), {"Leap"}),
+    (date(2023, 2, 21), set()),
+])
+async def test_get_birthdays(today, expected, birthday_contacts, client, auth_headers, monkeypatch):
+    freeze_today(monkeypatch, today)
+    response = await client.get("api/contacts/birthdays", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert {contact["first_name"] for contact in orjson.loads(response.content)} == expected
+
+
+async def test_get_birthdays_without_birthday(birthday_contacts, client, auth_headers, monkeypatch):
+    response = await client.post("api/contacts", json={"first_name": "NoBirthday"}, headers=auth_headers)
+    assert response.status_code == 201, response.text
+    assert orjson.loads(response.content)["birthday"] is None
+
+    # contact without birthday is in no window, not even around Jan 1
+    freeze_today(monkeypatch, date(2023, 12, 27))
+    response = await client.get("api/contacts/birthdays", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert "NoBirthday" not in {contact["first_name"] for contact in orjson.loads(response.content)}
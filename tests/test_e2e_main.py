@@ -0,0 +1,51 @@
+from ipaddress import ip_network
+
+import orjson
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+import main
+from main import app
+
+
+def client_from(ip: str) -> AsyncClient:
+    return AsyncClient(transport=ASGITransport(app=app, client=(ip, 50000)), base_url="http://127.0.0.1:8000")
+
+
+@pytest.fixture()
+def banned_network(monkeypatch):
+    monkeypatch.setattr(main, "BANNED_NETWORKS", (ip_network("172.16.0.0/12"),))
+    # results of the previous ban list are memoised
+    main._ip_is_banned.cache_clear()
+    yield
+    main._ip_is_banned.cache_clear()
+
+
+@pytest.mark.parametrize("ip", ["10.10.10.10", "172.16.5.4", "172.31.255.1"])
+async def test_banned_ip(ip, banned_network):
+    async with client_from(ip) as client:
+        response = await client.get("/")
+    assert response.status_code == 403, response.text
+    assert orjson.loads(response.content) == {"detail": "IP address is banned"}
+
+
+@pytest.mark.parametrize("ip", ["127.0.0.1", "10.10.10.11", "172.32.0.1"])
+async def test_not_banned_ip(ip, banned_network):
+    async with client_from(ip) as client:
+        response = await client.get("/")
+    assert response.status_code == 200, response.text
+
+
+@pytest.mark.parametrize("user_agent", ["Python-urllib/3.11", "Mozilla/5.0 (compatible; SomeBot/2.1)"])
+async def test_banned_user_agent(user_agent):
+    async with client_from("127.0.0.1") as client:
+        response = await client.get("/", headers={"user-agent": user_agent})
+    assert response.status_code == 403, response.text
+    assert orjson.loads(response.content) == {"detail": "User-agent is banned"}
+
+
+@pytest.mark.parametrize("user_agent", ["Mozilla/5.0 (X11; Linux x86_64) Firefox/125.0", "python-httpx/0.27.0"])
+async def test_allowed_user_agent(user_agent):
+    async with client_from("127.0.0.1") as client:
+        response = await client.get("/", headers={"user-agent": user_agent})
+    assert response.status_code == 200, response.text
@@ -1,69 +1,65 @@
-from unittest.mock import MagicMock, AsyncMock, Mock, patch
-import cloudinary
-import pytest
+import time
+
+import orjson
 
 from services.auth import auth_service
-from entity.models import User
-import repository.users as repository_users
-from conf import messages
+from repository.users import user_cache_key
+
+
+async def test_get_me(client, auth_headers):
+    response = await client.get("api/users/me", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert orjson.loads(response.content) == {"id": 1, "username": "user", "email": "user@example.com", "avatar": None,
+                               "role": "user"}
+
+
+async def test_get_me_from_cache(client, auth_headers, redis_mock):
+    # avatar differs from the database row, so the response shows the cached user was used
+    await redis_mock.set(user_cache_key("user@example.com"),
+                         orjson.dumps({"id": 1, "username": "user", "email": "user@example.com",
+                                       "avatar": "https://cached/avatar.png", "role": "user", "confirmed": True}))
 
+    response = await client.get("api/users/me", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert orjson.loads(response.content) == {"id": 1, "username": "user", "email": "user@example.com",
+                                              "avatar": "https://cached/avatar.png", "role": "user"}
 
-def test_get_me(client, get_token, monkeypatch):
-    with patch.object(auth_service, 'cache') as redis_mock:
-        redis_mock.get.return_value = None
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
 
-        token = get_token
+async def test_get_me_expired_cached_token(client, monkeypatch):
+    token = auth_service.create_access_token(data={"sub": "user@example.com"}, expire_delta=60)
+    headers = {"Authorization": f"Bearer {token}"}
 
-        headers = {"Authorization": f"Bearer {token}"}
+    response = await client.get("api/users/me", headers=headers)
+    assert response.status_code == 200, response.text
 
-        response = client.get("api/users/me", headers=headers)
-        assert response.status_code == 200, response.text
-        assert response.json() == {"id": 1, "username": "user", "email": "user@example.com", "avatar": None,
-                                   "role": "user"}
+    # verified token is memoised, expiration is still checked
+    later = time.time() + 120
+    monkeypatch.setattr("services.auth.time.time", lambda: later)
+    response = await client.get("api/users/me", headers=headers)
+    assert response.status_code == 401, response.text
 
 
-def test_get_me_not_authorized(client, monkeypatch):
-    with patch.object(auth_service, 'cache') as redis_mock:
-        redis_mock.get.return_value = None
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
-        response = client.get("api/users/me")
-        assert response.status_code == 401, response.text
-        assert response.json() == {"detail": "Not authenticated"}
+async def test_get_me_not_authorized(client):
+    response = await client.get("api/users/me")
+    assert response.status_code == 401, response.text
+    assert orjson.loads(response.content) == {"detail": "Not authenticated"}
 
 
-def test_avatar_not_authorized(client, monkeypatch):
-    with patch.object(auth_service, 'cache') as redis_mock:
-        redis_mock.get.return_value = None
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
-        response = client.get("api/users/avatar")
-        assert response.status_code == 405, response.text
-        assert response.json() == {"detail": "Method Not Allowed"}
+async def test_avatar_not_authorized(client):
+    response = await client.get("api/users/avatar")
+    assert response.status_code == 405, response.text
+    assert orjson.loads(response.content) == {"detail": "Method Not Allowed"}
 
 
 # in this test real file uploaded to the Cloudinary service
 
-def test_avatar_authorized_with_valid_token(client, get_token, monkeypatch):
-    with patch.object(auth_service, 'cache') as redis_mock:
-        redis_mock.get.return_value = None
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
-
-        token = get_token  # Get a valid authentication token
-        headers = {"Authorization": f"Bearer {token}"}
-
-        # WARNING!!!
-        # real file uploaded to the Cloudinary service
-        # uncomment if you want to test it
-        # with open("./tests/_image.jpg", "rb") as image_file:
-        #     response = client.patch("api/users/avatar", headers=headers, files={"file": image_file})
-        #
-        # assert response.status_code == 200
-        # assert response.json()["avatar"] is not None
+async def test_avatar_authorized_with_valid_token(client, auth_headers):
+    # WARNING!!!
+    # real file uploaded to the Cloudinary service
+    # uncomment if you want to test it
+    # with open("./tests/_image.jpg", "rb") as image_file:
+    #     response = await client.patch("api/users/avatar", headers=auth_headers, files={"file": image_file})
+    #
+    # assert response.status_code == 200
+    # assert orjson.loads(response.content)["avatar"] is not None
+    pass
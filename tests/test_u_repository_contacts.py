@@ -1,212 +1,157 @@
-import unittest
-from unittest.mock import MagicMock, AsyncMock, Mock, patch
+from datetime import date
 
-from sqlalchemy.ext.asyncio import AsyncSession
+import pytest
+from sqlalchemy.dialects import postgresql
 
-from entity.models import Contact, User
-from schemas.contacts import ContactSchema, ContactUpdateSchema, ContactResponseSchema
+from entity.models import Contact
+from fakes import stub_scalars_all, stub_scalar_one_or_none
+from schemas.contacts import ContactSchema, ContactUpdateSchema
 from repository.contacts import create_contact, get_contact, get_contacts, update_contact, delete_contact, \
     get_contact_by_email, get_contact_by_phone, search_contacts, get_birthdays
 
 from fastapi import HTTPException
 from conf import messages
 
-
-class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
-    def setUp(self):
-        self.user = User(id=1, username='user', password='12345678', email='user@example.com', confirmed=True)
-        self.session = AsyncMock(spec=AsyncSession)
-
-    async def test_get_contacts(self):
-        limit = 10
-        offset = 0
-        contacts = [Contact(id=1,
-                            first_name='name1',
-                            last_name='lname1',
-                            email='user1@example.com',
-                            phone='111111111',
-                            notes='notes1'),
-                    Contact(id=2,
-                            first_name='name2',
-                            last_name='lname2',
-                            email='user2@example.com',
-                            phone='222222222',
-                            notes='notes2')]
-        mocked_contacts = MagicMock()
-        mocked_contacts.scalars.return_value.all.return_value = contacts
-        self.session.execute.return_value = mocked_contacts
-        result = await get_contacts(limit, offset, self.session, self.user)
-        self.assertEquals(result, contacts)
-
-    async def create_contact(self):
-        body = ContactSchema(first_name='name1', last_name='lname1', email='user1@example.com',
-                             phone='111111111', notes='notes1')
-        # result = await create_contact(body, self.session, self.user)
-        with patch(
-                'repository.contacts.create_contact') as mocked_create_contact:
-            result = await create_contact(body, self.session, self.user)
-
-        mocked_create_contact.assert_called_once_with(body, self.session, self.user)
-
-        self.assertIsInstance(result, Contact)
-        self.assertEquals(result.first_name, body.first_name)
-        self.assertEquals(result.last_name, body.last_name)
-        self.assertEquals(result.email, body.email)
-        self.assertEquals(result.phone, body.phone)
-        self.assertEquals(result.notes, body.notes)
-        self.session.commit.assert_called()
-        self.session.refresh.assert_called()
-        self.session.commit.assert_called_once()
-        self.session.refresh.assert_called_once()
-
-    async def test_update_contact(self):
-        body = ContactUpdateSchema(first_name='name1', last_name='lname1', email='user1@example.com',
-                                   phone='111111111', notes='notes1')
-        mocked_contact = MagicMock()
-        mocked_contact.scalars_or_none.return_value = Contact(id=1, first_name='name1', last_name='lname1',
-                                                              email='user1@example.com',
-                                                              phone='111111111', notes='notes1')
-        self.session.execute.return_value = mocked_contact
-        result = await update_contact(1, body, self.session, self.user)
-        self.assertEquals(result.first_name, body.first_name)
-        self.assertEquals(result.last_name, body.last_name)
-        self.assertEquals(result.email, body.email)
-        self.assertEquals(result.phone, body.phone)
-        self.assertEquals(result.notes, body.notes)
-        self.session.commit.assert_called_once()
-
-    async def test_update_not_existed_contact(self):
-        """
-        Test update_contact with not existed contact id
-        and check if it raises HTTPException with 404 status code and 'Contact not found' message
-        """
-        body = ContactUpdateSchema(first_name='name1', last_name='lname1', email='user1@example.com',
-                                   phone='111111111', notes='notes1')
-
-        mocked_update_contact = MagicMock(side_effect=HTTPException(status_code=404, detail="Contact not found"))
-
-        self.session.execute.return_value = mocked_update_contact
-        self.session.execute.return_value.scalar_one_or_none.return_value = None
-
-        with patch('repository.contacts.update_contact', mocked_update_contact) as mock_update_contact:
-            with self.assertRaises(HTTPException) as context:
-                result = await update_contact(100, body, self.session, self.user)
-
-            self.assertEqual(context.exception.status_code, 404)
-            self.assertEqual(context.exception.detail, messages.CONTACT_NOT_FOUND)
-
-    async def test_delete_contact(self):
-        mocked_contact = MagicMock()
-        mocked_contact.scalars_or_none.return_value = Contact(id=1, first_name='name1', last_name='lname1',
-                                                              email='user1@example.com',
-                                                              phone='111111111', notes='notes1')
-        self.session.execute.return_value = mocked_contact
-        result = await delete_contact(1, self.session, self.user)
-        # self.assertIsInstance(result, Contact)
-        self.session.delete.assert_called_once()
-
-    async def test_delete_not_existed_contact(self):
-        mocked_contact = MagicMock()
-        mocked_contact.scalars_or_none.return_value = None
-        self.session.execute.return_value = mocked_contact
-        self.session.execute.return_value.scalar_one_or_none.return_value = None
-        result = await delete_contact(100, self.session, self.user)
-        self.assertIsNone(result)
-
-    async def test_get_contact(self):
-        contact_id = 1
-        expected_contact = Contact(id=contact_id, first_name='name1', last_name='lname1', user=self.user)
-        mocked_contact = MagicMock()
-        mocked_contact.scalar_one_or_none.return_value = expected_contact
-        self.session.execute.return_value = mocked_contact
-        result = await get_contact(contact_id, self.session, self.user)
-        self.assertEqual(result, expected_contact)
-
-    async def test_get_contact_not_exist(self):
-        contact_id = 10
-        expected_contact = None
-        mocked_contact = MagicMock()
-        mocked_contact.scalar_one_or_none.return_value = expected_contact
-        self.session.execute.return_value = mocked_contact
-        result = await get_contact(contact_id, self.session, self.user)
-        self.assertEqual(result, expected_contact)
-
-    async def test_get_contact_by_email(self):
-        email = 'user1@example.com'
-        expected_contact = Contact(id=1, first_name='name1', last_name='lname1', user=self.user)
-        mocked_contact = MagicMock()
-        mocked_contact.scalar_one_or_none.return_value = expected_contact
-        self.session.execute.return_value = mocked_contact
-        result = await get_contact_by_email(email, self.session, self.user)
-        self.assertEqual(result, expected_contact)
-
-    async def test_get_contact_by_phone(self):
-        phone = '111111111'
-        expected_contact = Contact(id=1, first_name='name1', last_name='lname1', user=self.user)
-        mocked_contact = MagicMock()
-        mocked_contact.scalar_one_or_none.return_value = expected_contact
-        self.session.execute.return_value = mocked_contact
-        result = await get_contact_by_phone(phone, self.session, self.user)
-        self.assertEqual(result, expected_contact)
-
-    async def test_search_contacts(self):
-        limit = 10
-        offset = 0
-        query = 'name1'
-        contacts = [Contact(id=1,
-                            first_name='name1',
-                            last_name='lname1',
-                            email='user1@example.com',
-                            phone='111111111',
-                            notes='notes1'),
-                    Contact(id=2,
-                            first_name='name2',
-                            last_name='lname2',
-                            email='user2@example.com',
-                            phone='222222222',
-                            notes='notes2')]
-        mocked_contacts = MagicMock()
-        mocked_contacts.scalars.return_value.all.return_value = contacts
-        self.session.execute.return_value = mocked_contacts
-        result = await search_contacts(limit, offset, query, self.session, self.user)
-        self.assertEquals(result, contacts)
-
-    async def test_search_not_existed_contacts(self):
-        limit = 10
-        offset = 0
-        query = 'name1111'
-        contacts = []
-        mocked_contacts = MagicMock()
-        mocked_contacts.scalars.return_value.all.return_value = contacts
-        self.session.execute.return_value = mocked_contacts
-        result = await search_contacts(limit, offset, query, self.session, self.user)
-        self.assertEquals(result, contacts)
-
-    async def test_get_birthdays(self):
-        contacts = [Contact(id=1,
-                            first_name='name1',
-                            last_name='lname1',
-                            email='user1@example.com',
-                            phone='111111111',
-                            notes='notes1',
-                            birthday='2022-01-01'),
-                    Contact(id=2,
-                            first_name='name2',
-                            last_name='lname2',
-                            email='user2@example.com',
-                            phone='222222222',
-                            notes='notes2',
-                            birthday='2022-02-02')]
-        mocked_contacts = MagicMock()
-        mocked_contacts.scalars.return_value.all.return_value = contacts
-        self.session.execute.return_value = mocked_contacts
-        result = await get_birthdays(self.session, self.user)
-        self.assertEquals(result, contacts)
-
-    async def test_get_birthdays_no_contacts_return(self):
-        contacts = []
-        mocked_contacts = MagicMock()
-        mocked_contacts.scalars.return_value.all.return_value = contacts
-        self.session.execute.return_value = mocked_contacts
-        result = await get_birthdays(self.session, self.user)
-        self.assertEquals(result, contacts)
+# validated once, repository functions only read them
+_CONTACT_BODY = ContactSchema(first_name='name1', last_name='lname1', email='user1@example.com',
+                              phone='111111111', notes='notes1')
+_CONTACT_UPDATE_BODY = ContactUpdateSchema(first_name='name1', last_name='lname1', email='user1@example.com',
+                                           phone='111111111', notes='notes1')
+_CONTACT_PARTIAL_BODY = ContactSchema(first_name='new_name')
+_CONTACT_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'notes')
+
+# rows returned by the mocked list queries, shared by the tests
+_CONTACTS = (Contact(id=1, first_name='name1', last_name='lname1', email='user1@example.com', phone='111111111',
+                     notes='notes1'),
+             Contact(id=2, first_name='name2', last_name='lname2', email='user2@example.com', phone='222222222',
+                     notes='notes2'))
+_BIRTHDAY_CONTACTS = (Contact(id=1, first_name='name1', last_name='lname1', email='user1@example.com',
+                              phone='111111111', notes='notes1', birthday=date(2000, 1, 1)),
+                      Contact(id=2, first_name='name2', last_name='lname2', email='user2@example.com',
+                              phone='222222222', notes='notes2', birthday=date(2000, 1, 2)))
+
+
+async def test_get_contacts(user, session):
+    limit = 10
+    offset = 0
+    contacts = list(_CONTACTS)
+    stub_scalars_all(session, contacts)
+    result = await get_contacts(limit, offset, session, user)
+    assert result == contacts
+
+
+@pytest.mark.parametrize("inserted", [True, False])
+async def test_create_contact(inserted, user, session):
+    """
+    Test create_contact inserts the contact of the user with ON CONFLICT DO NOTHING
+    and returns None when a contact with the same email or phone exists
+    """
+    body = _CONTACT_BODY
+    contact = Contact(id=1, user_id=user.id, **body.model_dump(include=set(_CONTACT_FIELDS))) if inserted else None
+    session.scalar.return_value = contact
+    result = await create_contact(body, session, user)
+
+    assert result is contact
+    stmt = session.scalar.await_args.args[0].compile(dialect=postgresql.dialect())
+    assert "ON CONFLICT DO NOTHING" in str(stmt)
+    assert stmt.params["user_id"] == user.id
+    assert {f: stmt.params[f] for f in _CONTACT_FIELDS} == body.model_dump(include=set(_CONTACT_FIELDS))
+    session.commit.assert_awaited_once()
+
+
+async def test_update_contact(user, session):
+    body = _CONTACT_UPDATE_BODY
+    session.get.return_value = Contact(id=1, first_name='name1', last_name='lname1',
+                                       email='user1@example.com',
+                                       phone='111111111', notes='notes1', user_id=user.id)
+    result = await update_contact(1, body, session, user)
+    assert {f: getattr(result, f) for f in _CONTACT_FIELDS} == body.model_dump(include=set(_CONTACT_FIELDS))
+    session.commit.assert_called_once()
+
+
+async def test_update_contact_partial(user, session):
+    body = _CONTACT_PARTIAL_BODY
+    session.get.return_value = Contact(id=1, first_name='name1', last_name='lname1',
+                                       email='user1@example.com',
+                                       phone='111111111', notes='notes1', user_id=user.id)
+    result = await update_contact(1, body, session, user)
+    assert result.first_name == 'new_name'
+    assert result.last_name == 'lname1'
+    assert result.email == 'user1@example.com'
+    assert result.phone == '111111111'
+    assert result.notes == 'notes1'
+
+
+async def test_update_not_existed_contact(user, session):
+    """
+    Test update_contact with not existed contact id
+    and check if it raises HTTPException with 404 status code and 'Contact not found' message
+    """
+    body = _CONTACT_UPDATE_BODY
+    session.get.return_value = None
+
+    with pytest.raises(HTTPException) as context:
+        await update_contact(100, body, session, user)
+
+    assert context.value.status_code == 404
+    assert context.value.detail == messages.CONTACT_NOT_FOUND
+
+
+async def test_delete_contact(user, session):
+    session.get.return_value = Contact(id=1, first_name='name1', last_name='lname1',
+                                       email='user1@example.com',
+                                       phone='111111111', notes='notes1', user_id=user.id)
+    result = await delete_contact(1, session, user)
+    # assert isinstance(result, Contact)
+    session.delete.assert_called_once()
+
+
+async def test_delete_not_existed_contact(user, session):
+    session.get.return_value = None
+    result = await delete_contact(100, session, user)
+    assert result is None
+
+
+@pytest.mark.parametrize("contact_id, found", [(1, True), (10, False)])
+async def test_get_contact(contact_id, found, user, session):
+    expected_contact = Contact(id=contact_id, first_name='name1', last_name='lname1', user_id=user.id) if found \
+        else None
+    session.get.return_value = expected_contact
+    result = await get_contact(contact_id, session, user)
+    assert result == expected_contact
+
+
+async def test_get_contact_of_other_user(user, session):
+    contact_id = 1
+    session.get.return_value = Contact(id=contact_id, first_name='name1', last_name='lname1', user_id=2)
+    result = await get_contact(contact_id, session, user)
+    assert result is None
+
+
+@pytest.mark.parametrize("get_contact_by, key", [(get_contact_by_email, 'user1@example.com'),
+                                                 (get_contact_by_phone, '111111111')])
+async def test_get_contact_by(get_contact_by, key, user, session):
+    expected_contact = Contact(id=1, first_name='name1', last_name='lname1', email='user1@example.com',
+                               phone='111111111', user_id=user.id)
+    stub_scalar_one_or_none(session, expected_contact)
+    result = await get_contact_by(key, session, user)
+    assert result is expected_contact
+    assert key in (result.email, result.phone)
+
+
+@pytest.mark.parametrize("query, contacts", [('name1', _CONTACTS), ('name1111', ())])
+async def test_search_contacts(query, contacts, user, session):
+    limit = 10
+    offset = 0
+    contacts = list(contacts)
+    stub_scalars_all(session, contacts)
+    result = await search_contacts(limit, offset, query, session, user)
+    assert result == contacts
+
+
+@pytest.mark.parametrize("contacts", [_BIRTHDAY_CONTACTS, ()])
+async def test_get_birthdays(contacts, user, session):
+    contacts = list(contacts)
+    stub_scalars_all(session, contacts)
+    result = await get_birthdays(session, user)
+    assert result == contacts
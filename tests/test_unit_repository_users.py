@@ -1,139 +1,146 @@
-import unittest
-from unittest.mock import MagicMock, AsyncMock, Mock, patch
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import MagicMock, AsyncMock
 
-from sqlalchemy.ext.asyncio import AsyncSession
+import orjson
+import pytest
 
 from entity.models import User
-from schemas.users import UserSchema, UserResponse, TokenSchema, RequestEmail
+from fakes import FakeAsyncSession, execute_result, stub_execute, stub_scalar_one_or_none
+from schemas.users import UserSchema
 from repository.users import update_token, create_user, get_user_by_email, get_user_by_username, confirmed_email, \
-    update_avatar_url
-
-
-class TestAsyncUser(unittest.IsolatedAsyncioTestCase):
-
-    def setUp(self):
-        self.user = User(id=1, username='user', password='12345678', email='user@example.com', confirmed=True)
-        self.new_token = 'updated_token'
-        self.new_avatar_url = 'https://new-avatar.com/image.jpg'
-        self.contact = {
-            "first_name": "Jack",
-            "last_name": "Smith",
-            "email": "jack@example.com",
-            "birthday": "2000-01-01",
-            "phone": "1234567890",
-            "notes": "user 1 notes"
-        }
-        self.session = AsyncMock(spec=AsyncSession)
-
-    async def test_update_token(self):
-        mocked_user = MagicMock()
-        mocked_user.scalars_or_none.return_value = self.user
-        self.session.execute.return_value = mocked_user
-        result = await update_token(self.user, self.new_token, self.session)
-        self.assertIsNone(result)
-        self.session.commit.assert_called_once()
-
-    async def test_create_user(self):
-        body = UserSchema(username='user', password='12345678', email='user@example.com')
-        result = await create_user(body, self.session)
-        self.assertIsInstance(result, User)
-        self.assertEquals(result.username, 'user')
-        self.assertEquals(result.password, '12345678')
-        self.assertEquals(result.email, 'user@example.com')
-        self.assertIsNotNone(result.avatar)
-        self.session.commit.assert_called_once()
-
-    async def test_get_user_by_email(self):
-        """Tests if get_user_by_email retrieves a user by email."""
-        self.session.execute.return_value.scalar_one_or_none.return_value = self.user
-        existing_email = "user@example.com"
-        user = await get_user_by_email(existing_email, self.session)
-        user = await user
-        self.assertEqual(user.username, self.user.username)
-        self.assertEqual(user.email, self.user.email)
-        self.assertEqual(user.confirmed, self.user.confirmed)
-
-    async def test_get_non_existing_user_by_email(self):
-        """Tests if get_user_by_email retrieves a not existing user by email."""
-        existing_email = "user@example.com"
-        # Test case with non-existent user
-        self.session.execute.return_value.scalar_one_or_none.return_value = None
-        user = await get_user_by_email(existing_email, self.session)
-        user = await user
-        self.assertIsNone(user)
-
-    async def test_get_user_by_not_existing_email(self):
-        """Tests if get_user_by_email retrieves a user by not existing email."""
-        self.session.execute.return_value.scalar_one_or_none.return_value = self.user
-        not_existing_email = "not_existing_user@example.com"
-        # Test case with non-existent email
-        self.session.execute.return_value.scalar_one_or_none.return_value = None
-        user = await get_user_by_email(not_existing_email, self.session)
-        user = await user
-        self.assertIsNone(user)
-
-    async def test_get_user_by_username(self):
-        self.session.execute.return_value.scalar_one_or_none.return_value = self.user
-        existing_user = "user"
-        user = await get_user_by_username(existing_user, self.session)
-        user = await user
-        self.assertEqual(user.username, self.user.username)
-        self.assertEqual(user.email, self.user.email)
-        self.assertEqual(user.confirmed, self.user.confirmed)
-
-    async def test_get_non_existing_user_by_username(self):
-        existing_user = "user"
-        # Test case with non-existent user
-        self.session.execute.return_value.scalar_one_or_none.return_value = None
-        user = await get_user_by_username(existing_user, self.session)
-        user = await user
-        self.assertIsNone(user)
-
-    async def test_get_user_by_not_existing_username(self):
-        self.session.execute.return_value.scalar_one_or_none.return_value = self.user
-        not_existing_user = "not_existing_user"
-        self.session.execute.return_value.scalar_one_or_none.return_value = None
-        user = await get_user_by_email(not_existing_user, self.session)
-        user = await user
-        self.assertIsNone(user)
-
-    async def test_confirmed_email(self):
-        """Tests if confirmed_email marks a user as confirmed."""
-        mocked_get_user_by_email = AsyncMock(return_value=self.user)
-        self.session.execute.return_value = mocked_get_user_by_email
-
-        mocked_get_user_by_email.return_value = User(
-            id=1, username='user', password='12345678', email='user@example.com', confirmed=False
-        )
-        self.session.execute.return_value = mocked_get_user_by_email
-        with patch('repository.users.get_user_by_email', mocked_get_user_by_email):
-            result = await confirmed_email('user@example.com', self.session)
-
-            self.session.commit.assert_called_once()
-            self.session.refresh.assert_not_called()
-
-    async def test_update_avatar_url_success(self):
-        """Tests successful update of avatar URL."""
-        mocked_get_user_by_email = AsyncMock(return_value=self.user)
-        self.session.execute.return_value = mocked_get_user_by_email
-        mocked_get_user_by_email.return_value = self.user
-        self.session.execute.return_value = mocked_get_user_by_email
-
-        with patch('repository.users.get_user_by_email', mocked_get_user_by_email):
-            updated_user = await update_avatar_url(self.user.email, self.new_avatar_url, self.session)
-
-        self.assertIsInstance(updated_user, User)
-        self.assertEqual(updated_user.avatar, self.new_avatar_url)
-        self.session.commit.assert_called_once()
-        self.session.refresh.assert_called_once()
-
-    async def test_update_avatar_url_user_not_found(self):
-        """Tests update_avatar_url behavior when the user is not found."""
-        self.session.execute.return_value.scalar_one_or_none.return_value = None
-
-        with self.assertRaises(Exception):
-            await update_avatar_url(self.user.email, self.session)
-            await update_avatar_url(self.user.email, self.new_avatar_url, self.session)
-
-        self.session.commit.assert_not_called()
-        self.session.refresh.assert_not_called()
+    update_avatar_url, user_cache_key
+
+new_token = 'updated_token'
+new_avatar_url = 'https://new-avatar.com/image.jpg'
+_USER_BODY = UserSchema(username='user', password='12345678', email='user@example.com')
+_USER_FIELDS = ('username', 'password', 'email')
+
+
+async def test_update_token(user, session):
+    stub_execute(session, execute_result())
+    result = await update_token(user, new_token, session)
+    assert result is None
+    session.commit.assert_called_once()
+
+
+async def test_create_user(session):
+    body = _USER_BODY
+    result = await create_user(body, session)
+    assert isinstance(result, User)
+    assert {f: getattr(result, f) for f in _USER_FIELDS} == body.model_dump(include=set(_USER_FIELDS))
+    assert result.avatar is not None
+    session.commit.assert_called_once()
+
+
+@pytest.mark.parametrize("get_user, key", [(get_user_by_email, "user@example.com"),
+                                          (get_user_by_username, "user")])
+async def test_get_user(get_user, key, user, session):
+    """Tests if get_user_by_email and get_user_by_username retrieve an existing user."""
+    stub_scalar_one_or_none(session, user)
+    result = await get_user(key, session)
+    assert result.username == user.username
+    assert result.email == user.email
+    assert result.confirmed == user.confirmed
+
+
+@pytest.mark.parametrize("get_user, key", [(get_user_by_email, "user@example.com"),
+                                          (get_user_by_email, "not_existing_user@example.com"),
+                                          (get_user_by_username, "user"),
+                                          (get_user_by_username, "not_existing_user")])
+async def test_get_user_not_found(get_user, key, session):
+    """Tests if get_user_by_email and get_user_by_username return None for a not existing user."""
+    stub_scalar_one_or_none(session, None)
+    result = await get_user(key, session)
+    assert result is None
+
+
+async def test_get_user_by_email_concurrent_misses(user, session, monkeypatch):
+    """Tests if concurrent cache misses for the same email share a single SELECT."""
+
+    result = execute_result(scalar_one_or_none=user)
+
+    async def slow_execute(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        return result
+
+    session.execute.side_effect = slow_execute
+    other_session = FakeAsyncSession()
+    other_session.merge.return_value = user
+    cache_mock = SimpleNamespace(get=AsyncMock(return_value=None), set=AsyncMock())
+    monkeypatch.setattr('repository.users.cache', cache_mock)
+    first, second = await asyncio.gather(get_user_by_email(user.email, session),
+                                         get_user_by_email(user.email, other_session))
+
+    assert first.email == user.email
+    assert second.email == user.email
+    session.execute.assert_awaited_once()
+    other_session.execute.assert_not_awaited()
+    other_session.merge.assert_awaited_once()
+    cache_mock.set.assert_awaited_once()
+
+
+async def test_get_user_by_email_caches_public_fields(user, session, redis_mock):
+    """Tests if get_user_by_email caches the user without the password hash and refresh token."""
+    stub_scalar_one_or_none(session, User(id=1, username='user', password='hash', email='user@example.com',
+                                          refresh_token='token', confirmed=True))
+    await get_user_by_email(user.email, session)
+
+    cached = orjson.loads(redis_mock.data[user_cache_key(user.email)])
+    assert cached == {"id": 1, "username": "user", "email": "user@example.com", "avatar": None, "role": None,
+                      "confirmed": True}
+
+    session.merge.side_effect = lambda cached_user, load: cached_user
+    result = await get_user_by_email(user.email, session)
+    assert (result.id, result.email) == (1, user.email)
+    assert "password" not in vars(result) and "refresh_token" not in vars(result)
+    session.execute.assert_awaited_once()
+
+
+async def test_confirmed_email(session):
+    """Tests if confirmed_email marks a user as confirmed."""
+    stub_execute(session, execute_result())
+    await confirmed_email('user@example.com', session)
+
+    stmt = session.execute.await_args.args[0].compile()
+    assert str(stmt).startswith("UPDATE users SET confirmed=:confirmed")
+    assert "WHERE users.email = :email_1" in str(stmt)
+    assert stmt.params == {"confirmed": True, "email_1": "user@example.com"}
+    session.commit.assert_awaited_once()
+    session.refresh.assert_not_called()
+
+
+async def test_confirmed_email_drops_email_token(session, monkeypatch):
+    """Tests if confirmed_email removes the cached confirmation token."""
+    cache_mock = MagicMock(delete=AsyncMock())
+    monkeypatch.setattr('repository.users.cache', cache_mock)
+    await confirmed_email('user@example.com', session)
+
+    cache_mock.delete.assert_any_await('email_token:user@example.com')
+
+
+async def test_update_avatar_url_success(user, session):
+    """Tests successful update of avatar URL."""
+    updated = User(id=1, username='user', password='12345678', email='user@example.com', confirmed=True,
+                   avatar=new_avatar_url)
+    stub_execute(session, execute_result(scalar_one=updated))
+
+    updated_user = await update_avatar_url(user.email, new_avatar_url, session)
+
+    assert isinstance(updated_user, User)
+    assert updated_user.avatar == new_avatar_url
+    session.execute.assert_called_once()
+    session.commit.assert_called_once()
+    session.refresh.assert_not_called()
+
+
+async def test_update_avatar_url_user_not_found(user, session):
+    """Tests update_avatar_url behavior when the user is not found."""
+    stub_scalar_one_or_none(session, None)
+
+    with pytest.raises(Exception):
+        await update_avatar_url(user.email, session)
+        await update_avatar_url(user.email, new_avatar_url, session)
+
+    session.commit.assert_not_called()
+    session.refresh.assert_not_called()
@@ -0,0 +1,162 @@
+import asyncio
+from unittest.mock import AsyncMock, call
+
+import aiosmtplib
+import pytest
+from fastapi_mail import MessageSchema, MessageType
+from fastapi_mail.errors import ConnectionErrors
+
+import services.email as email_service
+from fakes import FakeSMTP
+from services.email import EmailSender, conf, send_batch, email_worker, stop_email_worker
+
+_BATCH = [(f'user{i}@example.com', f'user{i}', 'http://127.0.0.1:8000/') for i in range(12)]
+_MESSAGE = MessageSchema(subject='Confirm your email', recipients=['user@example.com'], body='<p>Hello</p>',
+                         subtype=MessageType.html)
+
+
+@pytest.fixture()
+def smtp_sender(monkeypatch):
+    monkeypatch.setattr(FakeSMTP, 'created', [])
+    monkeypatch.setattr(email_service.aiosmtplib, 'SMTP', FakeSMTP)
+    return EmailSender(conf, pool_size=1)
+
+
+@pytest.fixture()
+def send_email_mock(monkeypatch):
+    mock = AsyncMock()
+    monkeypatch.setattr(email_service, 'send_email', mock)
+    return mock
+
+
+@pytest.fixture()
+def send_batch_mock(monkeypatch):
+    mock = AsyncMock()
+    monkeypatch.setattr(email_service, 'send_batch', mock)
+    return mock
+
+
+@pytest.fixture()
+def outbox(monkeypatch):
+    queue = asyncio.Queue()
+    monkeypatch.setattr(email_service, 'outbox', queue)
+    monkeypatch.setattr(email_service, 'FLUSH_INTERVAL_SEC', 0.01)
+    return queue
+
+
+async def test_sender_reuses_connection(smtp_sender):
+    await smtp_sender.send_message(_MESSAGE)
+    await smtp_sender.send_message(_MESSAGE)
+
+    assert len(FakeSMTP.created) == 1
+    smtp = FakeSMTP.created[0]
+    assert len(smtp.sent) == 2
+    assert smtp.sent[0]["To"] == "user@example.com"
+    assert smtp.sent[0]["Subject"] == "Confirm your email"
+
+
+async def test_sender_reconnects_dropped_connection(smtp_sender):
+    await smtp_sender.send_message(_MESSAGE)
+    dropped = FakeSMTP.created[0]
+    dropped.noop_error = aiosmtplib.SMTPServerDisconnected("server closed the connection")
+
+    await smtp_sender.send_message(_MESSAGE)
+
+    assert len(FakeSMTP.created) == 2
+    assert not dropped.connected
+    assert len(FakeSMTP.created[1].sent) == 1
+
+
+async def test_sender_cycles_connection(smtp_sender, monkeypatch):
+    monkeypatch.setattr(EmailSender, 'MAX_MESSAGES', 1)
+    await smtp_sender.send_message(_MESSAGE)
+    await smtp_sender.send_message(_MESSAGE)
+
+    assert len(FakeSMTP.created) == 2
+    assert not FakeSMTP.created[0].connected
+
+
+async def test_sender_error(smtp_sender):
+    await smtp_sender.send_message(_MESSAGE)
+    failing = FakeSMTP.created[0]
+    failing.send_error = aiosmtplib.SMTPRecipientsRefused([])
+
+    with pytest.raises(ConnectionErrors):
+        await smtp_sender.send_message(_MESSAGE)
+
+    # failed connection is dropped, the next message opens a new one
+    assert not failing.connected
+    await smtp_sender.send_message(_MESSAGE)
+    assert len(FakeSMTP.created) == 2
+    assert len(FakeSMTP.created[1].sent) == 1
+
+
+async def test_sender_quit(smtp_sender):
+    await smtp_sender.send_message(_MESSAGE)
+    await smtp_sender.quit()
+    assert not FakeSMTP.created[0].connected
+
+
+async def test_send_batch(send_email_mock):
+    await send_batch(_BATCH)
+    assert send_email_mock.await_args_list == [call(*item) for item in _BATCH]
+
+
+async def test_send_batch_aborts_when_server_fails(send_email_mock, capsys):
+    send_email_mock.side_effect = ConnectionErrors("connection refused")
+    await send_batch(_BATCH)
+    # first chunk of POOL_SIZE failed, that's more than a third of the batch
+    assert send_email_mock.await_count == email_service.EmailSender.POOL_SIZE
+    assert "Error: 12 of 12 emails not sent, 5 failed" in capsys.readouterr().out
+
+
+async def test_send_batch_single_failure(send_email_mock, capsys):
+    send_email_mock.side_effect = ConnectionErrors("connection refused")
+    await send_batch(_BATCH[:1])
+    assert "Error: 1 of 1 emails not sent, 1 failed" in capsys.readouterr().out
+
+
+async def test_email_worker_batches(outbox, send_batch_mock, monkeypatch):
+    monkeypatch.setattr(email_service, 'BATCH_SIZE', 2)
+    for item in _BATCH[:3]:
+        outbox.put_nowait(item)
+    outbox.put_nowait(None)
+
+    await asyncio.wait_for(email_worker(), 1)
+
+    assert send_batch_mock.await_args_list == [call(_BATCH[:2]), call(_BATCH[2:3])]
+
+
+async def test_email_worker_flushes_after_interval(outbox, send_batch_mock):
+    worker = asyncio.create_task(email_worker())
+    outbox.put_nowait(_BATCH[0])
+    await asyncio.sleep(0.1)
+
+    # sent on FLUSH_INTERVAL_SEC timeout, the worker keeps running
+    send_batch_mock.assert_awaited_once_with(_BATCH[:1])
+    assert not worker.done()
+    await stop_email_worker(worker, timeout=1)
+    assert worker.done()
+
+
+async def test_email_worker_survives_failed_batch(outbox, send_batch_mock, monkeypatch, capsys):
+    monkeypatch.setattr(email_service, 'BATCH_SIZE', 1)
+    send_batch_mock.side_effect = [RuntimeError("template error"), None]
+    worker = asyncio.create_task(email_worker())
+    outbox.put_nowait(_BATCH[0])
+    outbox.put_nowait(_BATCH[1])
+
+    await stop_email_worker(worker, timeout=1)
+
+    assert send_batch_mock.await_args_list == [call(_BATCH[:1]), call(_BATCH[1:2])]
+    assert worker.exception() is None
+    assert "Error: template error" in capsys.readouterr().out
+
+
+async def test_stop_email_worker_sends_queued_emails(outbox, send_batch_mock):
+    worker = asyncio.create_task(email_worker())
+    outbox.put_nowait(_BATCH[0])
+
+    await stop_email_worker(worker, timeout=1)
+
+    send_batch_mock.assert_awaited_once_with(_BATCH[:1])
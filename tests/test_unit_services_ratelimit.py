@@ -0,0 +1,65 @@
+import pytest
+from fastapi import HTTPException
+from fastapi_limiter import FastAPILimiter, default_identifier, http_default_callback
+from redis.exceptions import ConnectionError
+from starlette.requests import Request
+from starlette.responses import Response
+
+from fakes import FakeLimiterRedis
+from services.ratelimit import RateLimit, LUA_SHA
+
+
+@pytest.fixture()
+def limiter_redis(monkeypatch):
+    redis = FakeLimiterRedis()
+    redis.scripts.add(LUA_SHA)
+    monkeypatch.setattr(FastAPILimiter, 'redis', redis)
+    monkeypatch.setattr(FastAPILimiter, 'prefix', 'fastapi-limiter')
+    monkeypatch.setattr(FastAPILimiter, 'identifier', default_identifier)
+    monkeypatch.setattr(FastAPILimiter, 'http_callback', http_default_callback)
+    return redis
+
+
+def make_request():
+    return Request({"type": "http", "method": "GET", "path": "/api/contacts", "headers": [],
+                    "client": ("127.0.0.1", 50000)})
+
+
+async def test_under_limit(limiter_redis):
+    rate_limit = RateLimit(times=2, seconds=10)
+    assert await rate_limit(make_request(), Response()) is None
+    assert await rate_limit(make_request(), Response()) is None
+    assert limiter_redis.counters == {"fastapi-limiter:127.0.0.1:/api/contacts:GET": 2}
+
+
+async def test_over_limit(limiter_redis):
+    rate_limit = RateLimit(times=1, seconds=10)
+    await rate_limit(make_request(), Response())
+
+    with pytest.raises(HTTPException) as context:
+        await rate_limit(make_request(), Response())
+
+    assert context.value.status_code == 429
+    assert context.value.headers == {"Retry-After": "10"}
+
+
+async def test_script_not_loaded(limiter_redis):
+    # Redis restarted or flushed its script cache: EVAL runs the script and loads it again
+    limiter_redis.scripts.clear()
+    rate_limit = RateLimit(times=1, seconds=10)
+    assert await rate_limit(make_request(), Response()) is None
+    assert LUA_SHA in limiter_redis.scripts
+
+    with pytest.raises(HTTPException) as context:
+        await rate_limit(make_request(), Response())
+    assert context.value.status_code == 429
+
+
+async def test_redis_not_available(limiter_redis, capsys):
+    limiter_redis.error = ConnectionError("Error 111 connecting to localhost:6379")
+    rate_limit = RateLimit(times=1, seconds=10)
+
+    # fail open: requests are not limited while Redis is down
+    assert await rate_limit(make_request(), Response()) is None
+    assert await rate_limit(make_request(), Response()) is None
+    assert "Error: Error 111 connecting to localhost:6379" in capsys.readouterr().out